@@ -1,3 +1,4 @@
+import orjson
 from flask import Flask
 
 from config import Config
@@ -12,6 +13,9 @@ def create_app():
     app.config["SQLALCHEMY_ENGINE_OPTIONS"].update({
     "pool_pre_ping": True,
     "pool_recycle": 300,
+    # JSON columns (ImportBatch.payload) encode/decode via orjson instead of stdlib json
+    "json_serializer": _json_dumps,
+    "json_deserializer": orjson.loads,
 })
 
 
@@ -62,6 +66,10 @@ def create_app():
     return app
 
 
+def _json_dumps(obj) -> str:
+    return orjson.dumps(obj).decode("utf-8")
+
+
 def _bootstrap_admin_if_needed(app: Flask):
     """
     If the DB has no users, create a first admin user from env vars.
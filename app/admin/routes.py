@@ -123,6 +123,8 @@ _EXPECTED_TABLES = [
     "sales_lines",
     "daily_metrics",
     "sku_metrics_daily",
+    "daily_channel_metrics",
+    "sales_line_sku_daily",
     "app_state",
 ]
 
@@ -194,6 +196,7 @@ _EXPECTED_COLUMNS = {
         "kind": "VARCHAR(40)",
         "filename": "VARCHAR(255)",
         "payload": "JSONB",
+        "status": "VARCHAR(20)",
         "created_at": "TIMESTAMP",
     },
     "sales_orders": {
@@ -206,6 +209,10 @@ _EXPECTED_COLUMNS = {
         "customer_email": "VARCHAR(255)",
         "shipping_charged_gross": "NUMERIC(12,2)",
         "order_discount_gross": "NUMERIC(12,2)",
+        "total_revenue_net": "NUMERIC(14,4)",
+        "total_cost": "NUMERIC(14,4)",
+        "total_profit": "NUMERIC(14,4)",
+        "total_units": "INTEGER",
         "created_at": "TIMESTAMP",
     },
     "sales_lines": {
@@ -226,6 +233,8 @@ _EXPECTED_COLUMNS = {
         "cost_total": "NUMERIC(12,4)",
         "profit": "NUMERIC(12,4)",
         "cost_source_po_id": "INTEGER",
+        "order_date": "DATE",
+        "channel": "VARCHAR(40)",
         "created_at": "TIMESTAMP",
     },
     "daily_metrics": {
@@ -252,6 +261,33 @@ _EXPECTED_COLUMNS = {
         "discount_net": "NUMERIC(14,4)",
         "created_at": "TIMESTAMP",
     },
+    "daily_channel_metrics": {
+        "id": "INTEGER",
+        "metric_date": "DATE",
+        "channel": "VARCHAR(40)",
+        "orders_count": "INTEGER",
+        "units": "INTEGER",
+        "revenue_net": "NUMERIC(14,4)",
+        "cogs": "NUMERIC(14,4)",
+        "profit": "NUMERIC(14,4)",
+        "discount_gross": "NUMERIC(14,4)",
+        "discount_net": "NUMERIC(14,4)",
+        "created_at": "TIMESTAMP",
+    },
+    "sales_line_sku_daily": {
+        "id": "INTEGER",
+        "sku": "VARCHAR(80)",
+        "order_date": "DATE",
+        "channel": "VARCHAR(40)",
+        "description": "VARCHAR(255)",
+        "qty": "INTEGER",
+        "revenue_net": "NUMERIC(14,4)",
+        "cost_total": "NUMERIC(14,4)",
+        "profit": "NUMERIC(14,4)",
+        "line_discount_gross": "NUMERIC(14,4)",
+        "order_discount_alloc_gross": "NUMERIC(14,4)",
+        "updated_at": "TIMESTAMP",
+    },
     "app_state": {
         "id": "INTEGER",
         "key": "VARCHAR(80)",
@@ -269,17 +305,39 @@ _EXPECTED_INDEX_NAMES = [
     "ix_daily_metrics_metric_date",
     "ix_sku_metrics_daily_metric_date",
     "ix_sku_metrics_daily_sku",
+    "ix_daily_metrics_date_cover",
+    "ix_sku_metrics_daily_date_sku_cover",
+    "ix_daily_channel_metrics_metric_date",
+    "ix_sales_line_sku_daily_date_channel_sku",
     "ix_app_state_key",
     "ix_sales_orders_order_date",
     "ix_sales_orders_channel",
+    "ix_sales_orders_lower_channel",
+    "ix_sales_orders_order_date_lower_channel",
+    "ix_sales_orders_order_date_id",
     "ix_sales_lines_sales_order_id",
     "ix_sales_lines_item_id",
+    "ix_sales_lines_order_date",
+    "ix_sales_lines_sales_order_id_sku",
+    "ix_po_order_number_lower_trgm",
+    "ix_po_supplier_name_lower_trgm",
+    "ix_po_brand_lower_trgm",
+    "ix_so_order_number_trgm",
+    "ix_so_customer_name_trgm",
+    "ix_so_customer_email_trgm",
+    "ix_items_sku_lower_trgm",
+    "ix_items_description_lower_trgm",
+    "ix_purchase_lines_sku_lower_trgm",
+    "ix_so_channel_lower_trgm",
+    "ix_sales_lines_sku_lower_trgm",
 ]
 
 _EXPECTED_CONSTRAINT_NAMES = [
     "uq_saved_search_user_context_name",
     "uq_sales_orders_channel_order_number",
     "uq_sku_metrics_daily_date_sku",
+    "uq_daily_channel_metrics_date_channel",
+    "uq_sales_line_sku_daily_sku_date_channel",
 ]
 
 
@@ -425,6 +483,7 @@ CREATE TABLE import_batches (
   kind VARCHAR(40) NOT NULL DEFAULT 'purchase_import',
   filename VARCHAR(255),
   payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status VARCHAR(20) NOT NULL DEFAULT 'ready',
   created_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 CREATE INDEX IF NOT EXISTS ix_import_batches_kind ON import_batches(kind);
@@ -440,11 +499,16 @@ CREATE TABLE sales_orders (
   customer_email VARCHAR(255),
   shipping_charged_gross NUMERIC(12,2),
   order_discount_gross NUMERIC(12,2),
+  total_revenue_net NUMERIC(14,4),
+  total_cost NUMERIC(14,4),
+  total_profit NUMERIC(14,4),
+  total_units INTEGER,
   created_at TIMESTAMP NOT NULL DEFAULT NOW(),
   CONSTRAINT uq_sales_orders_channel_order_number UNIQUE (channel, order_number)
 );
 CREATE INDEX IF NOT EXISTS ix_sales_orders_order_date ON sales_orders(order_date);
 CREATE INDEX IF NOT EXISTS ix_sales_orders_channel ON sales_orders(channel);
+CREATE INDEX IF NOT EXISTS ix_sales_orders_order_date_id ON sales_orders(order_date DESC, id DESC);
 """.strip(),
         "sales_lines": """
 CREATE TABLE sales_lines (
@@ -465,11 +529,17 @@ CREATE TABLE sales_lines (
   cost_total NUMERIC(12,4),
   profit NUMERIC(12,4),
   cost_source_po_id INTEGER,
+  order_date DATE,
+  channel VARCHAR(40),
   created_at TIMESTAMP NOT NULL DEFAULT NOW()
 );
 CREATE INDEX IF NOT EXISTS ix_sales_lines_sku ON sales_lines(sku);
 CREATE INDEX IF NOT EXISTS ix_sales_lines_sales_order_id ON sales_lines(sales_order_id);
 CREATE INDEX IF NOT EXISTS ix_sales_lines_item_id ON sales_lines(item_id);
+CREATE INDEX IF NOT EXISTS ix_sales_lines_order_date ON sales_lines(order_date)
+  INCLUDE (channel, sales_order_id, qty, revenue_net, profit, line_discount_gross, order_discount_alloc_gross, vat_rate);
+CREATE INDEX IF NOT EXISTS ix_sales_lines_sales_order_id_sku ON sales_lines(sales_order_id, sku)
+  INCLUDE (qty, revenue_net, cost_total, profit);
 """.strip(),
         "daily_metrics": """
 CREATE TABLE daily_metrics (
@@ -502,6 +572,41 @@ CREATE TABLE sku_metrics_daily (
 );
 CREATE INDEX IF NOT EXISTS ix_sku_metrics_daily_metric_date ON sku_metrics_daily(metric_date);
 CREATE INDEX IF NOT EXISTS ix_sku_metrics_daily_sku ON sku_metrics_daily(sku);
+""".strip(),
+        "daily_channel_metrics": """
+CREATE TABLE daily_channel_metrics (
+  id SERIAL PRIMARY KEY,
+  metric_date DATE NOT NULL,
+  channel VARCHAR(40) NOT NULL,
+  orders_count INTEGER NOT NULL DEFAULT 0,
+  units INTEGER NOT NULL DEFAULT 0,
+  revenue_net NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  cogs NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  profit NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  discount_gross NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  discount_net NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  CONSTRAINT uq_daily_channel_metrics_date_channel UNIQUE (metric_date, channel)
+);
+CREATE INDEX IF NOT EXISTS ix_daily_channel_metrics_metric_date ON daily_channel_metrics(metric_date);
+""".strip(),
+        "sales_line_sku_daily": """
+CREATE TABLE sales_line_sku_daily (
+  id SERIAL PRIMARY KEY,
+  sku VARCHAR(80) NOT NULL,
+  order_date DATE NOT NULL,
+  channel VARCHAR(40) NOT NULL,
+  description VARCHAR(255),
+  qty INTEGER NOT NULL DEFAULT 0,
+  revenue_net NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  cost_total NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  profit NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  line_discount_gross NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  order_discount_alloc_gross NUMERIC(14,4) NOT NULL DEFAULT 0.0000,
+  updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+  CONSTRAINT uq_sales_line_sku_daily_sku_date_channel UNIQUE (sku, order_date, channel)
+);
+CREATE INDEX IF NOT EXISTS ix_sales_line_sku_daily_date_channel_sku ON sales_line_sku_daily(order_date, channel, sku);
 """.strip(),
         "app_state": """
 CREATE TABLE app_state (
@@ -587,6 +692,7 @@ def _db_patch_statements():
     stmts.append("ALTER TABLE import_batches ADD COLUMN IF NOT EXISTS kind VARCHAR(40);")
     stmts.append("ALTER TABLE import_batches ADD COLUMN IF NOT EXISTS filename VARCHAR(255);")
     stmts.append("ALTER TABLE import_batches ADD COLUMN IF NOT EXISTS payload JSONB NOT NULL DEFAULT '{}'::jsonb;")
+    stmts.append("ALTER TABLE import_batches ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready';")
     stmts.append("ALTER TABLE import_batches ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT NOW();")
     stmts.append("CREATE INDEX IF NOT EXISTS ix_import_batches_kind ON import_batches(kind);")
 
@@ -617,6 +723,12 @@ def _db_patch_statements():
     stmts.append("ALTER TABLE purchase_orders ADD COLUMN IF NOT EXISTS created_at TIMESTAMP NOT NULL DEFAULT NOW();")
     stmts.append("CREATE INDEX IF NOT EXISTS ix_purchase_orders_order_number ON purchase_orders(order_number);")
 
+    # Trigram indexes on lower(col) so the purchases list's lower(col) LIKE '%q%' filter can use an index
+    stmts.append("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_po_order_number_lower_trgm ON purchase_orders USING gin (lower(order_number) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_po_supplier_name_lower_trgm ON purchase_orders USING gin (lower(supplier_name) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_po_brand_lower_trgm ON purchase_orders USING gin (lower(brand) gin_trgm_ops);")
+
     stmts.append("""
     CREATE TABLE IF NOT EXISTS purchase_lines (
       id SERIAL PRIMARY KEY,
@@ -694,6 +806,14 @@ def _db_patch_statements():
 
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_orders_order_date ON sales_orders(order_date);")
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_orders_channel ON sales_orders(channel);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_orders_lower_channel ON sales_orders(lower(channel));")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_orders_order_date_lower_channel ON sales_orders(order_date, lower(channel));")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_orders_order_date_id ON sales_orders(order_date DESC, id DESC);")
+
+    # Trigram indexes for the sales list search (lower(col) LIKE '%q%')
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_so_order_number_trgm ON sales_orders USING gin (lower(order_number) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_so_customer_name_trgm ON sales_orders USING gin (lower(customer_name) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_so_customer_email_trgm ON sales_orders USING gin (lower(customer_email) gin_trgm_ops);")
 
     stmts.append("""
     DO $$
@@ -765,6 +885,53 @@ def _db_patch_statements():
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_lines_sales_order_id ON sales_lines(sales_order_id);")
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_lines_item_id ON sales_lines(item_id);")
 
+    # Order date/channel denormalized onto lines (backfill any lines imported before the columns existed)
+    stmts.append("ALTER TABLE sales_lines ADD COLUMN IF NOT EXISTS order_date DATE;")
+    stmts.append("ALTER TABLE sales_lines ADD COLUMN IF NOT EXISTS channel VARCHAR(40);")
+    stmts.append("""
+    UPDATE sales_lines sl
+       SET order_date = so.order_date,
+           channel = so.channel
+      FROM sales_orders so
+     WHERE so.id = sl.sales_order_id
+       AND (sl.order_date IS NULL OR sl.channel IS NULL);
+    """)
+    stmts.append("""
+    CREATE INDEX IF NOT EXISTS ix_sales_lines_order_date ON sales_lines(order_date)
+      INCLUDE (channel, sales_order_id, qty, revenue_net, profit, line_discount_gross, order_discount_alloc_gross, vat_rate);
+    """)
+    stmts.append("""
+    CREATE INDEX IF NOT EXISTS ix_sales_lines_sales_order_id_sku ON sales_lines(sales_order_id, sku)
+      INCLUDE (qty, revenue_net, cost_total, profit);
+    """)
+    stmts.append("ANALYZE sales_lines;")
+    stmts.append("ANALYZE sales_orders;")
+
+    # Per-order line totals (denormalized for the orders list)
+    stmts.append("ALTER TABLE sales_orders ADD COLUMN IF NOT EXISTS total_revenue_net NUMERIC(14,4);")
+    stmts.append("ALTER TABLE sales_orders ADD COLUMN IF NOT EXISTS total_cost NUMERIC(14,4);")
+    stmts.append("ALTER TABLE sales_orders ADD COLUMN IF NOT EXISTS total_profit NUMERIC(14,4);")
+    stmts.append("ALTER TABLE sales_orders ADD COLUMN IF NOT EXISTS total_units INTEGER;")
+    stmts.append("""
+    UPDATE sales_orders so
+       SET total_revenue_net = COALESCE(t.rev, 0),
+           total_cost = COALESCE(t.cost, 0),
+           total_profit = COALESCE(t.profit, 0),
+           total_units = COALESCE(t.units, 0)
+      FROM sales_orders o
+      LEFT JOIN (
+        SELECT sales_order_id,
+               SUM(revenue_net) AS rev,
+               SUM(cost_total) AS cost,
+               SUM(profit) AS profit,
+               SUM(qty) AS units
+          FROM sales_lines
+         GROUP BY sales_order_id
+      ) t ON t.sales_order_id = o.id
+     WHERE o.id = so.id
+       AND so.total_units IS NULL;
+    """)
+
     # ---- dashboard metrics tables (Phase 4)
     stmts.append("""
     CREATE TABLE IF NOT EXISTS daily_metrics (
@@ -807,6 +974,157 @@ def _db_patch_statements():
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sku_metrics_daily_sku ON sku_metrics_daily(sku);")
     stmts.append("CREATE INDEX IF NOT EXISTS ix_sku_metrics_daily_date ON sku_metrics_daily(metric_date);")
 
+    # Covering indexes so date-range aggregates can use index-only scans
+    stmts.append("ALTER TABLE daily_metrics ADD COLUMN IF NOT EXISTS units INTEGER NOT NULL DEFAULT 0;")
+    stmts.append("ALTER TABLE sku_metrics_daily ADD COLUMN IF NOT EXISTS discount_net NUMERIC(14,4) NOT NULL DEFAULT 0;")
+    stmts.append("""
+    CREATE INDEX IF NOT EXISTS ix_daily_metrics_date_cover ON daily_metrics(metric_date)
+      INCLUDE (orders_count, units, revenue_net, cogs, profit, discount_net);
+    """)
+    stmts.append("""
+    CREATE INDEX IF NOT EXISTS ix_sku_metrics_daily_date_sku_cover ON sku_metrics_daily(metric_date, sku)
+      INCLUDE (units, revenue_net, profit, discount_net);
+    """)
+    stmts.append("ANALYZE daily_metrics;")
+    stmts.append("ANALYZE sku_metrics_daily;")
+
+    stmts.append("""
+    CREATE TABLE IF NOT EXISTS daily_channel_metrics (
+      id SERIAL PRIMARY KEY,
+      metric_date DATE NOT NULL,
+      channel VARCHAR(40) NOT NULL,
+      orders_count INTEGER NOT NULL DEFAULT 0,
+      units INTEGER NOT NULL DEFAULT 0,
+      revenue_net NUMERIC(14,4) NOT NULL DEFAULT 0,
+      cogs NUMERIC(14,4) NOT NULL DEFAULT 0,
+      profit NUMERIC(14,4) NOT NULL DEFAULT 0,
+      discount_gross NUMERIC(14,4) NOT NULL DEFAULT 0,
+      discount_net NUMERIC(14,4) NOT NULL DEFAULT 0,
+      created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    """)
+
+    stmts.append("""
+    DO $$
+    BEGIN
+      IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_daily_channel_metrics_date_channel'
+      ) THEN
+        ALTER TABLE daily_channel_metrics
+          ADD CONSTRAINT uq_daily_channel_metrics_date_channel UNIQUE (metric_date, channel);
+      END IF;
+    END$$;
+    """)
+
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_daily_channel_metrics_metric_date ON daily_channel_metrics(metric_date);")
+
+    # One-time full rebuild (imports keep it current afterwards); the app_state
+    # marker switches the reports channel breakdown over from live sums
+    stmts.append("""
+    DO $$
+    BEGIN
+      IF NOT EXISTS (SELECT 1 FROM app_state WHERE key = 'daily_channel_metrics_ready') THEN
+        DELETE FROM daily_channel_metrics;
+        INSERT INTO daily_channel_metrics (
+          metric_date, channel, orders_count, units, revenue_net, cogs, profit, discount_gross, discount_net, created_at
+        )
+        SELECT
+          so.order_date::date,
+          so.channel,
+          COUNT(DISTINCT so.id),
+          COALESCE(SUM(sl.qty), 0),
+          COALESCE(SUM(sl.revenue_net), 0),
+          COALESCE(SUM(sl.cost_total), 0),
+          COALESCE(SUM(sl.profit), 0),
+          COALESCE(SUM(COALESCE(sl.line_discount_gross,0) + COALESCE(sl.order_discount_alloc_gross,0)), 0),
+          COALESCE(SUM(
+            (COALESCE(sl.line_discount_gross,0) + COALESCE(sl.order_discount_alloc_gross,0))
+            / (1 + (sl.vat_rate / 100))
+          ), 0),
+          NOW()
+        FROM sales_lines sl
+        JOIN sales_orders so ON so.id = sl.sales_order_id
+        WHERE so.order_date IS NOT NULL
+        GROUP BY so.order_date::date, so.channel;
+        INSERT INTO app_state (key, value, updated_at)
+        VALUES ('daily_channel_metrics_ready', to_char(NOW(), 'YYYY-MM-DD HH24:MI:SS'), NOW())
+        ON CONFLICT (key) DO NOTHING;
+      END IF;
+    END$$;
+    """)
+    stmts.append("ANALYZE daily_channel_metrics;")
+
+    # ---- per-SKU daily sales line sums (discount report + alerts)
+    stmts.append("""
+    CREATE TABLE IF NOT EXISTS sales_line_sku_daily (
+      id SERIAL PRIMARY KEY,
+      sku VARCHAR(80) NOT NULL,
+      order_date DATE NOT NULL,
+      channel VARCHAR(40) NOT NULL,
+      description VARCHAR(255),
+      qty INTEGER NOT NULL DEFAULT 0,
+      revenue_net NUMERIC(14,4) NOT NULL DEFAULT 0,
+      cost_total NUMERIC(14,4) NOT NULL DEFAULT 0,
+      profit NUMERIC(14,4) NOT NULL DEFAULT 0,
+      line_discount_gross NUMERIC(14,4) NOT NULL DEFAULT 0,
+      order_discount_alloc_gross NUMERIC(14,4) NOT NULL DEFAULT 0,
+      updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+    );
+    """)
+
+    stmts.append("""
+    DO $$
+    BEGIN
+      IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'uq_sales_line_sku_daily_sku_date_channel'
+      ) THEN
+        ALTER TABLE sales_line_sku_daily
+          ADD CONSTRAINT uq_sales_line_sku_daily_sku_date_channel UNIQUE (sku, order_date, channel);
+      END IF;
+    END$$;
+    """)
+
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_line_sku_daily_date_channel_sku ON sales_line_sku_daily(order_date, channel, sku);")
+
+    # One-time full rebuild (imports keep it current afterwards); the app_state
+    # marker switches the discount report and alerts over from live sums
+    stmts.append("""
+    DO $$
+    BEGIN
+      IF NOT EXISTS (SELECT 1 FROM app_state WHERE key = 'sales_line_sku_daily_ready') THEN
+        DELETE FROM sales_line_sku_daily;
+        INSERT INTO sales_line_sku_daily (
+          sku, order_date, channel, description, qty, revenue_net, cost_total, profit,
+          line_discount_gross, order_discount_alloc_gross, updated_at
+        )
+        SELECT
+          sl.sku, so.order_date, so.channel, MAX(sl.description),
+          COALESCE(SUM(sl.qty), 0),
+          COALESCE(SUM(sl.revenue_net), 0),
+          COALESCE(SUM(sl.cost_total), 0),
+          COALESCE(SUM(sl.profit), 0),
+          COALESCE(SUM(sl.line_discount_gross), 0),
+          COALESCE(SUM(sl.order_discount_alloc_gross), 0),
+          NOW()
+        FROM sales_lines sl
+        JOIN sales_orders so ON so.id = sl.sales_order_id
+        WHERE so.order_date IS NOT NULL
+        GROUP BY sl.sku, so.order_date, so.channel;
+        INSERT INTO app_state (key, value, updated_at)
+        VALUES ('sales_line_sku_daily_ready', to_char(NOW(), 'YYYY-MM-DD HH24:MI:SS'), NOW())
+        ON CONFLICT (key) DO NOTHING;
+      END IF;
+    END$$;
+    """)
+    stmts.append("ANALYZE sales_line_sku_daily;")
+
+    # ---- text filters + global search: lower(col) LIKE '%q%' (pg_trgm GIN on lower(col))
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_items_sku_lower_trgm ON items USING gin (lower(sku) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_items_description_lower_trgm ON items USING gin (lower(description) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_purchase_lines_sku_lower_trgm ON purchase_lines USING gin (lower(sku) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_so_channel_lower_trgm ON sales_orders USING gin (lower(channel) gin_trgm_ops);")
+    stmts.append("CREATE INDEX IF NOT EXISTS ix_sales_lines_sku_lower_trgm ON sales_lines USING gin (lower(sku) gin_trgm_ops);")
+
     return [s.strip() for s in stmts if s.strip()]
 
 
@@ -871,6 +1189,14 @@ def _recompute_metrics_range(d_from, d_to):
         text("DELETE FROM daily_metrics WHERE metric_date >= :d_from AND metric_date <= :d_to"),
         {"d_from": d_from, "d_to": d_to},
     )
+    db.session.execute(
+        text("DELETE FROM sales_line_sku_daily WHERE order_date >= :d_from AND order_date <= :d_to"),
+        {"d_from": d_from, "d_to": d_to},
+    )
+    db.session.execute(
+        text("DELETE FROM daily_channel_metrics WHERE metric_date >= :d_from AND metric_date <= :d_to"),
+        {"d_from": d_from, "d_to": d_to},
+    )
 
     # daily_metrics
     db.session.execute(
@@ -934,6 +1260,69 @@ def _recompute_metrics_range(d_from, d_to):
         {"d_from": d_from, "d_to": d_to},
     )
 
+    # daily_channel_metrics
+    db.session.execute(
+        text(
+            """
+            INSERT INTO daily_channel_metrics (
+              metric_date, channel, orders_count, units, revenue_net, cogs, profit, discount_gross, discount_net, created_at
+            )
+            SELECT
+              so.order_date::date AS metric_date,
+              so.channel AS channel,
+              COUNT(DISTINCT so.id) AS orders_count,
+              COALESCE(SUM(sl.qty), 0) AS units,
+              COALESCE(SUM(sl.revenue_net), 0) AS revenue_net,
+              COALESCE(SUM(sl.cost_total), 0) AS cogs,
+              COALESCE(SUM(sl.profit), 0) AS profit,
+              COALESCE(SUM(COALESCE(sl.line_discount_gross,0) + COALESCE(sl.order_discount_alloc_gross,0)), 0) AS discount_gross,
+              COALESCE(SUM(
+                (COALESCE(sl.line_discount_gross,0) + COALESCE(sl.order_discount_alloc_gross,0))
+                / (1 + (sl.vat_rate / 100))
+              ), 0) AS discount_net,
+              NOW() AS created_at
+            FROM sales_lines sl
+            JOIN sales_orders so ON so.id = sl.sales_order_id
+            WHERE so.order_date IS NOT NULL
+              AND so.order_date >= :d_from
+              AND so.order_date <= :d_to
+            GROUP BY so.order_date::date, so.channel
+            """
+        ),
+        {"d_from": d_from, "d_to": d_to},
+    )
+
+    # sales_line_sku_daily (normally maintained by imports; rebuilt here for the range)
+    db.session.execute(
+        text(
+            """
+            INSERT INTO sales_line_sku_daily (
+              sku, order_date, channel, description, qty, revenue_net, cost_total, profit,
+              line_discount_gross, order_discount_alloc_gross, updated_at
+            )
+            SELECT
+              sl.sku,
+              so.order_date,
+              so.channel,
+              MAX(sl.description),
+              COALESCE(SUM(sl.qty), 0),
+              COALESCE(SUM(sl.revenue_net), 0),
+              COALESCE(SUM(sl.cost_total), 0),
+              COALESCE(SUM(sl.profit), 0),
+              COALESCE(SUM(sl.line_discount_gross), 0),
+              COALESCE(SUM(sl.order_discount_alloc_gross), 0),
+              NOW()
+            FROM sales_lines sl
+            JOIN sales_orders so ON so.id = sl.sales_order_id
+            WHERE so.order_date IS NOT NULL
+              AND so.order_date >= :d_from
+              AND so.order_date <= :d_to
+            GROUP BY sl.sku, so.order_date, so.channel
+            """
+        ),
+        {"d_from": d_from, "d_to": d_to},
+    )
+
     # stamp app_state
     stamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
     db.session.execute(
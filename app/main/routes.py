@@ -203,7 +203,7 @@ def _low_margin_summary_mtd(d_from, d_to):
     margin_threshold = Decimal("20")
 
     if _has_agg(d_from, d_to):
-        rows = (
+        rollup = (
             db.session.query(
                 SkuMetricDaily.sku.label("sku"),
                 db.func.coalesce(db.func.sum(SkuMetricDaily.revenue_net), 0).label("rev"),
@@ -212,10 +212,10 @@ def _low_margin_summary_mtd(d_from, d_to):
             .filter(SkuMetricDaily.metric_date >= d_from)
             .filter(SkuMetricDaily.metric_date <= d_to)
             .group_by(SkuMetricDaily.sku)
-            .all()
+            .subquery()
         )
     else:
-        rows = (
+        rollup = (
             db.session.query(
                 SalesLine.sku.label("sku"),
                 db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev"),
@@ -225,27 +225,28 @@ def _low_margin_summary_mtd(d_from, d_to):
             .filter(SalesOrder.order_date >= d_from)
             .filter(SalesOrder.order_date <= d_to)
             .group_by(SalesLine.sku)
-            .all()
+            .subquery()
         )
 
-    neg_count = 0
-    low_count = 0
-    worst = []
-
-    for sku, rev_raw, prof_raw in rows:
-        rev = _d(rev_raw)
-        prof = _d(prof_raw)
-        margin = (prof / rev * Decimal("100")) if rev > 0 else Decimal("0")
-
-        if prof < 0:
-            neg_count += 1
-        if rev > 0 and margin < margin_threshold:
-            low_count += 1
-
-        worst.append({"sku": sku, "rev": rev, "profit": prof, "margin": margin})
-
-    worst.sort(key=lambda x: (float(x["margin"]), float(x["profit"])))
-    worst = worst[:10]
+    # Counts and the worst 10 are computed in SQL; only 10 rows come back to Python
+    # Divisor typed as plain NUMERIC so SQLAlchemy doesn't cast it to the bounded column type
+    margin = db.case((rollup.c.rev > 0, rollup.c.profit * 100 / db.type_coerce(rollup.c.rev, db.Numeric)), else_=0)
+    is_low = db.and_(rollup.c.rev > 0, rollup.c.profit * 100 < rollup.c.rev * margin_threshold)
+
+    counts = db.session.query(
+        db.func.coalesce(db.func.sum(db.case((rollup.c.profit < 0, 1), else_=0)), 0),
+        db.func.coalesce(db.func.sum(db.case((is_low, 1), else_=0)), 0),
+    ).one()
+    neg_count, low_count = int(counts[0]), int(counts[1])
+
+    worst = [
+        {"sku": sku, "rev": _d(rev), "profit": _d(prof), "margin": _d(m)}
+        for sku, rev, prof, m in (
+            db.session.query(rollup.c.sku, rollup.c.rev, rollup.c.profit, margin)
+            .order_by(margin.asc(), rollup.c.profit.asc(), rollup.c.sku.asc())
+            .limit(10)
+        )
+    ]
     return neg_count, low_count, worst, margin_threshold
 
 
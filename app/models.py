@@ -2,6 +2,7 @@ from datetime import datetime
 from decimal import Decimal
 
 from flask_login import UserMixin
+from sqlalchemy.dialects.postgresql import JSONB
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from .extensions import db
@@ -167,7 +168,10 @@ class ImportBatch(db.Model):
     kind = db.Column(db.String(40), nullable=False, default="purchase_import")  # purchase_import|sales_import
 
     filename = db.Column(db.String(255), nullable=True)
-    payload = db.Column(db.JSON, nullable=False)
+    # JSONB on Postgres (binary, TOAST-compressed when large); plain JSON elsewhere
+    payload = db.Column(db.JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    # parsing|ready|failed (large sales uploads are parsed in the background)
+    status = db.Column(db.String(20), nullable=False, default="ready")
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 
@@ -193,6 +197,12 @@ class SalesOrder(db.Model):
     shipping_charged_gross = db.Column(db.Numeric(12, 2), nullable=True)
     order_discount_gross = db.Column(db.Numeric(12, 2), nullable=True)
 
+    # Line totals, written at import so list pages don't re-aggregate sales_lines
+    total_revenue_net = db.Column(db.Numeric(14, 4), nullable=True)
+    total_cost = db.Column(db.Numeric(14, 4), nullable=True)
+    total_profit = db.Column(db.Numeric(14, 4), nullable=True)
+    total_units = db.Column(db.Integer, nullable=True)
+
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     lines = db.relationship(
@@ -206,6 +216,11 @@ class SalesOrder(db.Model):
         db.UniqueConstraint("channel", "order_number", name="uq_sales_orders_channel_order_number"),
         db.Index("ix_sales_orders_order_date", "order_date"),
         db.Index("ix_sales_orders_channel", "channel"),
+        # Channel filters compare lower(channel); these let them use an index
+        db.Index("ix_sales_orders_lower_channel", db.func.lower(channel)),
+        db.Index("ix_sales_orders_order_date_lower_channel", order_date, db.func.lower(channel)),
+        # Matches the orders list sort (order_date DESC, id DESC) so pages are read in index order
+        db.Index("ix_sales_orders_order_date_id", order_date.desc(), id.desc()),
     )
 
 
@@ -243,6 +258,10 @@ class SalesLine(db.Model):
     # Optional: traceability
     cost_source_po_id = db.Column(db.Integer, nullable=True)
 
+    # Denormalized from the order so date/channel aggregates can skip the sales_orders join
+    order_date = db.Column(db.Date, nullable=True)
+    channel = db.Column(db.String(40), nullable=True)
+
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     item = db.relationship("Item", lazy=True)
@@ -250,6 +269,21 @@ class SalesLine(db.Model):
     __table_args__ = (
         db.Index("ix_sales_lines_sales_order_id", "sales_order_id"),
         db.Index("ix_sales_lines_item_id", "item_id"),
+        db.Index(
+            "ix_sales_lines_order_date",
+            "order_date",
+            postgresql_include=[
+                "channel", "sales_order_id", "qty", "revenue_net", "profit",
+                "line_discount_gross", "order_discount_alloc_gross", "vat_rate",
+            ],
+        ),
+        # Items report: orders filtered by date/channel -> their lines grouped by sku
+        db.Index(
+            "ix_sales_lines_sales_order_id_sku",
+            "sales_order_id",
+            "sku",
+            postgresql_include=["qty", "revenue_net", "cost_total", "profit"],
+        ),
     )
 
 
@@ -280,6 +314,15 @@ class DailyMetric(db.Model):
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # Covering index: date-range SUMs (KPIs, trends) can be answered index-only on Postgres
+        db.Index(
+            "ix_daily_metrics_date_cover",
+            "metric_date",
+            postgresql_include=["orders_count", "units", "revenue_net", "cogs", "profit", "discount_net"],
+        ),
+    )
+
 
 class SkuMetricDaily(db.Model):
     """
@@ -304,8 +347,74 @@ class SkuMetricDaily(db.Model):
 
     __table_args__ = (
         db.UniqueConstraint("metric_date", "sku", name="uq_sku_metrics_daily_date_sku"),
+        # Covering index for the per-SKU MTD rollups
+        db.Index(
+            "ix_sku_metrics_daily_date_sku_cover",
+            "metric_date",
+            "sku",
+            postgresql_include=["units", "revenue_net", "profit", "discount_net"],
+        ),
     )
 
+class DailyChannelMetric(db.Model):
+    """
+    One row per (date, channel).
+    Used for the channel breakdown in reports (sales summary + CSV).
+    """
+    __tablename__ = "daily_channel_metrics"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    metric_date = db.Column(db.Date, nullable=False, index=True)
+    channel = db.Column(db.String(40), nullable=False)
+
+    orders_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+
+    revenue_net = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    cogs = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    profit = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+
+    discount_gross = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    discount_net = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("metric_date", "channel", name="uq_daily_channel_metrics_date_channel"),
+    )
+
+
+class SalesLineSkuDaily(db.Model):
+    """
+    One row per (sku, order_date, channel) with summed sales line values.
+    Maintained by the sales import (and rebuilt by metrics recompute);
+    used by the discount report and margin/discount alerts.
+    """
+    __tablename__ = "sales_line_sku_daily"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    sku = db.Column(db.String(80), nullable=False)
+    order_date = db.Column(db.Date, nullable=False)
+    channel = db.Column(db.String(40), nullable=False)
+    description = db.Column(db.String(255), nullable=True)
+
+    qty = db.Column(db.Integer, nullable=False, default=0)
+    revenue_net = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    cost_total = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    profit = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    line_discount_gross = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+    order_discount_alloc_gross = db.Column(db.Numeric(14, 4), nullable=False, default=Decimal("0.0000"))
+
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint("sku", "order_date", "channel", name="uq_sales_line_sku_daily_sku_date_channel"),
+        db.Index("ix_sales_line_sku_daily_date_channel_sku", "order_date", "channel", "sku"),
+    )
+
+
 class AppState(db.Model):
     """
     Single-row key/value store for simple app-level metadata.
@@ -1,16 +1,20 @@
 import csv
 import io
-from datetime import datetime
+from datetime import date, datetime
 from decimal import Decimal, InvalidOperation
 from urllib.parse import urlencode
 
 from flask import Blueprint, render_template, redirect, url_for, flash, request, Response
 from flask_login import login_required, current_user
+from sqlalchemy.orm import load_only
 
 from ..extensions import db
 from ..decorators import require_role, require_edit_permission
 from ..models import Item, PurchaseOrder, PurchaseLine, ImportBatch, SavedSearch
+from ..utils.csv_headers import norm_header as _norm_header
 from ..utils.csv_stream import stream_csv
+from ..utils.numbers import to_decimal as _d
+from ..utils.text_match import text_match
 from .forms import PurchaseCostsForm
 
 purchases_bp = Blueprint("purchases", __name__, url_prefix="/purchases")
@@ -41,12 +45,33 @@ PURCHASE_IMPORT_HEADERS = [
 ]
 
 
-def _validate_headers(fieldnames, expected_headers):
-    given = [ (h or "").strip() for h in (fieldnames or []) ]
-    expected = list(expected_headers)
-    missing = [h for h in expected if h not in given]
-    extra = [h for h in given if h not in expected]
-    return (len(missing) == 0 and len(extra) == 0), missing, extra, given
+# Normalized header -> template header, so "order number" / "ORDER_NUMBER" match "Order Number"
+_HEADER_BY_NORM = {_norm_header(h): h for h in PURCHASE_IMPORT_HEADERS}
+EXPECTED_NORM = frozenset(_HEADER_BY_NORM)
+
+
+def _validate_headers(fieldnames):
+    """
+    Compare CSV headers to the template ignoring case/spacing/punctuation.
+    Returns (ok, missing, extra, given, header_map) where header_map maps each
+    raw CSV header to its template header name.
+    """
+    raw = list(fieldnames or [])
+    given = [(h or "").strip() for h in raw]
+    given_norm = [_norm_header(h) for h in given]
+
+    header_map = {}
+    extra = []
+    for h, g, n in zip(raw, given, given_norm):
+        canonical = _HEADER_BY_NORM.get(n)
+        if canonical is None or canonical in header_map.values():
+            extra.append(g)
+            continue
+        header_map[h] = canonical
+
+    seen = set(given_norm)
+    missing = [h for n, h in _HEADER_BY_NORM.items() if n not in seen]
+    return (len(missing) == 0 and len(extra) == 0), missing, extra, given, header_map
 
 
 @purchases_bp.get("/import-template.csv")
@@ -61,10 +86,6 @@ def import_template_csv():
     return resp
 
 
-def _norm_header(s: str) -> str:
-    return "".join(ch.lower() for ch in (s or "").strip() if ch.isalnum())
-
-
 def _pick(row: dict, header_map: dict, *keys: str) -> str:
     for k in keys:
         h = header_map.get(_norm_header(k))
@@ -103,6 +124,19 @@ def _safe_date(val):
     s = (val or "").strip()
     if not s:
         return None
+    # Fast paths for the two fixed-width formats; strptime only handles the rest
+    if len(s) == 10:
+        if s[4] == "-" and s[7] == "-":
+            y, m, d = s[:4], s[5:7], s[8:]
+        elif s[2] == "/" and s[5] == "/":
+            d, m, y = s[:2], s[3:5], s[6:]
+        else:
+            y = m = d = ""
+        if y.isdigit() and m.isdigit() and d.isdigit():
+            try:
+                return date(int(y), int(m), int(d))
+            except ValueError:
+                return None
     for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y"):
         try:
             return datetime.strptime(s, fmt).date()
@@ -111,51 +145,81 @@ def _safe_date(val):
     return None
 
 
+# Columns the detail page + lines export actually render
+_LINE_DISPLAY_COLUMNS = (
+    PurchaseLine.sku,
+    PurchaseLine.description,
+    PurchaseLine.qty,
+    PurchaseLine.unit_cost_net,
+    PurchaseLine.packaging_per_unit,
+    PurchaseLine.freight_allocated_total,
+    PurchaseLine.freight_allocated_per_unit,
+    PurchaseLine.landed_unit_cost,
+)
+
+
 def _recalc_allocations(po: PurchaseOrder):
     """
     Recalculate freight allocation + landed costs for a purchase order.
     """
     lines = PurchaseLine.query.filter_by(purchase_order_id=po.id).all()
 
-    freight_total = Decimal(str(po.freight_total)) if po.freight_total is not None else Decimal("0")
+    freight_total = _d(po.freight_total)
     if freight_total <= 0:
         for ln in lines:
             ln.freight_allocated_total = Decimal("0")
             ln.freight_allocated_per_unit = Decimal("0")
-            pkg = Decimal(str(ln.packaging_per_unit)) if ln.packaging_per_unit is not None else Decimal("0")
-            ln.landed_unit_cost = Decimal(str(ln.unit_cost_net)) + pkg
+            ln.landed_unit_cost = _d(ln.unit_cost_net) + _d(ln.packaging_per_unit)
         db.session.commit()
         return
 
     method = po.allocation_method or "value"
 
-    if method == "qty":
-        base_total = sum(Decimal(ln.qty or 0) for ln in lines) or Decimal("0")
-        for ln in lines:
-            base = Decimal(ln.qty or 0)
-            alloc = (freight_total * base / base_total) if base_total > 0 else Decimal("0")
-            ln.freight_allocated_total = alloc
-            qty = Decimal(ln.qty or 0) or Decimal("1")
-            ln.freight_allocated_per_unit = (alloc / qty) if qty > 0 else Decimal("0")
-            pkg = Decimal(str(ln.packaging_per_unit)) if ln.packaging_per_unit is not None else Decimal("0")
-            ln.landed_unit_cost = Decimal(str(ln.unit_cost_net)) + ln.freight_allocated_per_unit + pkg
-        db.session.commit()
-        return
+    by_qty = method == "qty"  # default: value allocation
 
-    # default: value allocation
-    base_total = sum((Decimal(str(ln.unit_cost_net)) * Decimal(ln.qty or 0)) for ln in lines) or Decimal("0")
+    # One pass to collect per-line (qty, unit cost, base) and the base total
+    prepared = []
+    base_total = Decimal("0")
     for ln in lines:
-        base = (Decimal(str(ln.unit_cost_net)) * Decimal(ln.qty or 0))
+        qty = Decimal(ln.qty or 0)
+        unit_cost = _d(ln.unit_cost_net)
+        base = qty if by_qty else unit_cost * qty
+        prepared.append((ln, qty, unit_cost, base))
+        base_total += base
+
+    for ln, qty, unit_cost, base in prepared:
         alloc = (freight_total * base / base_total) if base_total > 0 else Decimal("0")
         ln.freight_allocated_total = alloc
-        qty = Decimal(ln.qty or 0) or Decimal("1")
+        qty = qty or Decimal("1")
         ln.freight_allocated_per_unit = (alloc / qty) if qty > 0 else Decimal("0")
-        pkg = Decimal(str(ln.packaging_per_unit)) if ln.packaging_per_unit is not None else Decimal("0")
-        ln.landed_unit_cost = Decimal(str(ln.unit_cost_net)) + ln.freight_allocated_per_unit + pkg
+        ln.landed_unit_cost = unit_cost + ln.freight_allocated_per_unit + _d(ln.packaging_per_unit)
 
     db.session.commit()
 
 
+def _filtered_po_query(q: str, date_field: str, date_from, date_to):
+    """
+    Purchase orders matching the list filters (shared by list + export).
+    """
+    query = PurchaseOrder.query
+    if q:
+        # Same lower(col) LIKE '%q%' as global search, served by the lower() trigram indexes
+        query = query.filter(
+            db.or_(
+                text_match(PurchaseOrder.order_number, q),
+                text_match(PurchaseOrder.supplier_name, q),
+                text_match(PurchaseOrder.brand, q),
+            )
+        )
+
+    col = PurchaseOrder.arrival_date if date_field == "arrival" else PurchaseOrder.order_date
+    if date_from:
+        query = query.filter(col >= date_from)
+    if date_to:
+        query = query.filter(col <= date_to)
+    return query
+
+
 @purchases_bp.get("")
 @login_required
 @require_role("viewer")
@@ -180,25 +244,23 @@ def list_purchase_orders():
     if page < 1:
         page = 1
 
-    query = PurchaseOrder.query
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(PurchaseOrder.order_number).contains(q),
-                db.func.lower(PurchaseOrder.supplier_name).contains(q),
-                db.func.lower(PurchaseOrder.brand).contains(q),
-            )
-        )
-
-    col = PurchaseOrder.arrival_date if date_field == "arrival" else PurchaseOrder.order_date
-    if date_from:
-        query = query.filter(col >= date_from)
-    if date_to:
-        query = query.filter(col <= date_to)
+    query = _filtered_po_query(q, date_field, date_from, date_to)
 
-    total = query.count()
+    # count(id) over the filtered rows only; Query.count() wraps the full entity SELECT in a subquery
+    total = query.with_entities(db.func.count(PurchaseOrder.id)).scalar() or 0
     orders = (
-        query.order_by(PurchaseOrder.created_at.desc())
+        query.options(
+            load_only(
+                PurchaseOrder.id,
+                PurchaseOrder.order_number,
+                PurchaseOrder.supplier_name,
+                PurchaseOrder.brand,
+                PurchaseOrder.order_date,
+                PurchaseOrder.arrival_date,
+                PurchaseOrder.freight_total,
+            )
+        )
+        .order_by(PurchaseOrder.created_at.desc())
         .offset((page - 1) * per_page)
         .limit(per_page)
         .all()
@@ -252,23 +314,27 @@ def export_purchase_orders_csv():
     date_from = _safe_date(request.args.get("from") or "")
     date_to = _safe_date(request.args.get("to") or "")
 
-    query = PurchaseOrder.query
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(PurchaseOrder.order_number).contains(q),
-                db.func.lower(PurchaseOrder.supplier_name).contains(q),
-                db.func.lower(PurchaseOrder.brand).contains(q),
+    query = _filtered_po_query(q, date_field, date_from, date_to)
+
+    rows = (
+        query.options(
+            load_only(
+                PurchaseOrder.order_number,
+                PurchaseOrder.supplier_name,
+                PurchaseOrder.brand,
+                PurchaseOrder.order_date,
+                PurchaseOrder.arrival_date,
+                PurchaseOrder.currency,
+                PurchaseOrder.freight_total,
+                PurchaseOrder.allocation_method,
             )
         )
-
-    col = PurchaseOrder.arrival_date if date_field == "arrival" else PurchaseOrder.order_date
-    if date_from:
-        query = query.filter(col >= date_from)
-    if date_to:
-        query = query.filter(col <= date_to)
-
-    rows = query.order_by(PurchaseOrder.created_at.desc()).yield_per(500)
+        .order_by(PurchaseOrder.created_at.desc())
+        .enable_eagerloads(False)
+        # server-side cursor: psycopg streams rows instead of buffering the whole result
+        .execution_options(stream_results=True)
+        .yield_per(500)
+    )
 
     headers = [
         "Order Number",
@@ -310,8 +376,11 @@ def export_purchase_lines_csv(po_id: int):
 
     rows = (
         PurchaseLine.query
+        .options(load_only(*_LINE_DISPLAY_COLUMNS))
         .filter_by(purchase_order_id=po.id)
         .order_by(PurchaseLine.sku.asc())
+        .enable_eagerloads(False)
+        .execution_options(stream_results=True)
         .yield_per(500)
     )
 
@@ -353,13 +422,25 @@ def purchase_detail(po_id: int):
         flash("Purchase order not found.", "danger")
         return redirect(url_for("purchases.list_purchase_orders"))
 
-    lines = PurchaseLine.query.filter_by(purchase_order_id=po.id).order_by(PurchaseLine.sku.asc()).all()
+    lines = (
+        PurchaseLine.query
+        .options(load_only(*_LINE_DISPLAY_COLUMNS))
+        .filter_by(purchase_order_id=po.id)
+        .order_by(PurchaseLine.sku.asc())
+        .all()
+    )
 
-    # Simple totals
-    total_qty = sum(l.qty or 0 for l in lines)
-    total_goods = sum(Decimal(str(l.unit_cost_net)) * Decimal(l.qty or 0) for l in lines)
-    total_freight_alloc = sum(Decimal(str(l.freight_allocated_total or 0)) for l in lines)
-    total_packaging = sum(Decimal(str(l.packaging_per_unit or 0)) * Decimal(l.qty or 0) for l in lines)
+    # Simple totals (single aggregate query; no per-line Python sums)
+    total_qty, total_goods, total_freight_alloc, total_packaging = (
+        db.session.query(
+            db.func.coalesce(db.func.sum(PurchaseLine.qty), 0),
+            db.func.coalesce(db.func.sum(PurchaseLine.unit_cost_net * PurchaseLine.qty), 0),
+            db.func.coalesce(db.func.sum(PurchaseLine.freight_allocated_total), 0),
+            db.func.coalesce(db.func.sum(PurchaseLine.packaging_per_unit * PurchaseLine.qty), 0),
+        )
+        .filter(PurchaseLine.purchase_order_id == po.id)
+        .one()
+    )
 
     return render_template(
         "purchases/order_detail.html",
@@ -427,7 +508,7 @@ def import_parse():
         flash("CSV appears empty or invalid.", "danger")
         return redirect(url_for("purchases.import_upload"))
 
-    ok_headers, missing, extra, given = _validate_headers(reader.fieldnames, PURCHASE_IMPORT_HEADERS)
+    ok_headers, missing, extra, given, header_map = _validate_headers(reader.fieldnames)
     if not ok_headers:
         return render_template(
             "purchases/import_upload.html",
@@ -436,6 +517,8 @@ def import_parse():
             row_errors=None,
         )
 
+    # Re-key rows by template header names so row lookups below are exact dict hits
+    reader.fieldnames = [header_map[h] for h in reader.fieldnames]
     rows = list(reader)
 
     # Validate rows (fail-fast: do not create an ImportBatch if any errors)
@@ -1,44 +1,51 @@
+import threading
 from datetime import date, datetime, timedelta
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
+from typing import Optional
 
-from flask import Blueprint, Response, flash, redirect, render_template, request, url_for
+from flask import Blueprint, current_app, flash, g, redirect, render_template, request, url_for
 from flask_login import login_required
 
 from ..decorators import require_role
 from ..extensions import db
-from ..models import SalesOrder, SalesLine
+from ..models import SalesLine
 from ..models import DailyMetric, SkuMetricDaily
-from ..models import DailyMetric, SkuMetricDaily, AppState
+from ..models import DailyMetric, SkuMetricDaily, AppState, DailyChannelMetric
+from ..utils.cache import TTLCache
+from ..utils.csv_stream import stream_csv
+from ..utils.dates import parse_date
+from ..sales.channels import channels as sales_channels
+from ..sales._aggregates import CHANNEL_DAILY_READY_KEY, rollup_ready
 
 reports_bp = Blueprint("reports", __name__, url_prefix="/reports")
 
+# Aggregate results only change when metrics are recomputed (daily tables) or sales are
+# imported (live tables), so keys carry a version stamp; the TTL just bounds memory.
+_reports_cache = TTLCache(ttl_seconds=3600, max_items=256)
+
+# Stale-while-revalidate snapshot of the reports index context (per worker).
+# The rendered HTML is not cached: the base layout is user-specific.
+_index_snapshot = {}  # "current" -> {"today", "version", "context"}
+_index_refresh_lock = threading.Lock()
+
 
 def _safe_date(val):
     """
-    Supports: YYYY-MM-DD, DD/MM/YYYY, DD/MM/YY, YYYY-MM-DD HH:MM:SS
+    Supports: YYYY-MM-DD, DD/MM/YYYY, DD/MM/YY, YYYY-MM-DD HH:MM:SS, YYYY-MM-DDTHH:MM:SS
     """
     s = (val or "").strip()
     if not s:
         return None
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
-    return None
-
-
-def _safe_decimal(val, default=Decimal("0")):
-    if val is None:
-        return default
-    s = str(val).strip()
-    if s == "":
-        return default
-    s = s.replace(",", ".")
-    try:
-        return Decimal(s)
-    except InvalidOperation:
-        return default
+    return parse_date(s)
+
+
+def _margin_pct(profit, revenue):
+    """
+    SQL margin % expression: profit / revenue * 100, 0 unless revenue > 0.
+    The divisor is typed as plain NUMERIC: SQLAlchemy casts it to its own type,
+    and the NUMERIC(12, 4) column type overflows for large summed revenue.
+    """
+    return db.func.coalesce(db.case((revenue > 0, profit * 100 / db.type_coerce(revenue, db.Numeric))), 0)
 
 
 def _period_starts(today: date):
@@ -48,10 +55,40 @@ def _period_starts(today: date):
     return start_7d, start_month, start_year
 
 
-def _sum_sales_range(d_from: date, d_to: date):
+@reports_bp.before_request
+def _period_dates():
+    # One UTC "today" + period boundaries per request (shared by views, helpers and cache keys)
+    g.today = datetime.utcnow().date()
+    g.start_7d, g.start_month, g.start_year = _period_starts(g.today)
+
+
+def _last_recompute():
+    state = AppState.query.filter_by(key="metrics_last_recompute").first()
+    return state.value if state else None
+
+
+def _sales_version():
+    """
+    Sales lines are only ever inserted (by the sales import), so the highest id
+    changes whenever live sales totals can.
+    """
+    return db.session.query(db.func.max(SalesLine.id)).scalar() or 0
+
+
+def _sum_sales_range(d_from: date, d_to: date, channel: Optional[str] = None):
     """
     Returns dict with: orders_count, units, revenue_net, profit, margin_pct,
     discount_gross, discount_net (profit lost), profit_no_discount
+    Optionally restricted to one (lowercased) channel.
+    """
+    key = f"sum_sales:{_sales_version()}:{d_from}:{d_to}:{channel or ''}"
+    return _reports_cache.get_or_set(key, lambda: _query_sales_range(d_from, d_to, channel))
+
+
+def _sales_range_kpi_stmt(by_channel: bool):
+    """
+    Range KPI aggregate over sales_lines with :d_from / :d_to (and :channel) bind params.
+    Built once at import so requests only bind values instead of rebuilding the expression tree.
     """
     # discount gross = line + allocated order discount
     disc_gross = (
@@ -63,28 +100,40 @@ def _sum_sales_range(d_from: date, d_to: date):
     vat_factor = db.literal(1) + (SalesLine.vat_rate / db.literal(100))
     disc_net = disc_gross / vat_factor
 
-    row = (
-        db.session.query(
-            db.func.count(db.func.distinct(SalesOrder.id)).label("orders"),
+    # order_date/channel are denormalized onto sales_lines, so no join to sales_orders
+    stmt = (
+        db.select(
+            db.func.count(db.func.distinct(SalesLine.sales_order_id)).label("orders"),
             db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
             db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev_net"),
             db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
             db.func.coalesce(db.func.sum(disc_gross), 0).label("disc_gross"),
             db.func.coalesce(db.func.sum(disc_net), 0).label("disc_net"),
+            _margin_pct(db.func.sum(SalesLine.profit), db.func.sum(SalesLine.revenue_net)).label("margin_pct"),
         )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-        .filter(SalesOrder.order_date >= d_from)
-        .filter(SalesOrder.order_date <= d_to)
-        .one()
+        .where(SalesLine.order_date >= db.bindparam("d_from"))
+        .where(SalesLine.order_date <= db.bindparam("d_to"))
     )
+    if by_channel:
+        stmt = stmt.where(db.func.lower(SalesLine.channel) == db.bindparam("channel"))
+    return stmt
+
+
+_SALES_RANGE_KPI = _sales_range_kpi_stmt(by_channel=False)
+_SALES_RANGE_KPI_BY_CHANNEL = _sales_range_kpi_stmt(by_channel=True)
 
-    rev = _safe_decimal(row.rev_net)
-    prof = _safe_decimal(row.profit)
-    disc_net_val = _safe_decimal(row.disc_net)
 
-    margin = Decimal("0")
-    if rev > 0:
-        margin = (prof / rev) * Decimal("100")
+def _query_sales_range(d_from: date, d_to: date, channel: Optional[str] = None):
+    if channel:
+        row = db.session.execute(
+            _SALES_RANGE_KPI_BY_CHANNEL, {"d_from": d_from, "d_to": d_to, "channel": channel}
+        ).one()
+    else:
+        row = db.session.execute(_SALES_RANGE_KPI, {"d_from": d_from, "d_to": d_to}).one()
+
+    rev = row.rev_net
+    prof = row.profit
+    disc_net_val = row.disc_net
 
     # Profit without discounts = profit + discount_net (costs unchanged)
     prof_no_disc = prof + disc_net_val
@@ -94,233 +143,293 @@ def _sum_sales_range(d_from: date, d_to: date):
         "units": int(row.units or 0),
         "revenue_net": rev,
         "profit": prof,
-        "margin_pct": margin,
-        "discount_gross": _safe_decimal(row.disc_gross),
+        "margin_pct": row.margin_pct,
+        "discount_gross": row.disc_gross,
         "discount_net": disc_net_val,                 # this is the profit lost to discounts (net)
         "profit_no_discount": prof_no_disc,
     }
 
 
-@reports_bp.get("")
-@login_required
-@require_role("viewer")
-def index():
-    today = datetime.utcnow().date()
-    start_7d, start_month, start_year = _period_starts(today)
-
-    # Last recompute info
-    state = AppState.query.filter_by(key="metrics_last_recompute").first()
-    last_recompute = state.value if state else None
-
-    # Pull KPI totals from aggregates (if missing, show zeros)
-    def _kpi_from_daily(d_from, d_to):
-        row = (
+def _channel_rows_query(d_from: date, d_to: date, channel: Optional[str] = None):
+    """
+    Per-channel orders/units/rev_net/profit for the range, highest revenue first.
+    Read from daily_channel_metrics (kept current by sales imports) once it has
+    been backfilled; before that, summed live from sales lines.
+    """
+    if rollup_ready(CHANNEL_DAILY_READY_KEY):
+        M = DailyChannelMetric
+        rows = (
+            db.session.query(
+                M.channel.label("channel"),
+                M.orders_count.label("orders"),
+                M.units.label("units"),
+                M.revenue_net.label("rev_net"),
+                M.profit.label("profit"),
+            )
+            .filter(M.metric_date >= d_from)
+            .filter(M.metric_date <= d_to)
+        )
+        if channel:
+            rows = rows.filter(db.func.lower(M.channel) == channel)
+        merged = rows.subquery()
+    else:
+        live = (
             db.session.query(
-                db.func.coalesce(db.func.sum(DailyMetric.orders_count), 0).label("orders"),
-                db.func.coalesce(db.func.sum(DailyMetric.units), 0).label("units"),
-                db.func.coalesce(db.func.sum(DailyMetric.revenue_net), 0).label("rev"),
-                db.func.coalesce(db.func.sum(DailyMetric.cogs), 0).label("cogs"),
-                db.func.coalesce(db.func.sum(DailyMetric.profit), 0).label("profit"),
-                db.func.coalesce(db.func.sum(DailyMetric.discount_net), 0).label("disc_net"),
+                SalesLine.channel.label("channel"),
+                db.func.count(db.func.distinct(SalesLine.sales_order_id)).label("orders"),
+                db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
+                db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev_net"),
+                db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
             )
-            .filter(DailyMetric.metric_date >= d_from)
-            .filter(DailyMetric.metric_date <= d_to)
-            .one()
+            .filter(SalesLine.order_date >= d_from)
+            .filter(SalesLine.order_date <= d_to)
+        )
+        if channel:
+            live = live.filter(db.func.lower(SalesLine.channel) == channel)
+        merged = live.group_by(SalesLine.channel).subquery()
+
+    rev_net = db.func.coalesce(db.func.sum(merged.c.rev_net), 0)
+    return (
+        db.session.query(
+            merged.c.channel.label("channel"),
+            db.func.coalesce(db.func.sum(merged.c.orders), 0).label("orders"),
+            db.func.coalesce(db.func.sum(merged.c.units), 0).label("units"),
+            rev_net.label("rev_net"),
+            db.func.coalesce(db.func.sum(merged.c.profit), 0).label("profit"),
+            _margin_pct(db.func.sum(merged.c.profit), db.func.sum(merged.c.rev_net)).label("margin_pct"),
         )
+        .group_by(merged.c.channel)
+        .order_by(db.desc(rev_net))
+    )
+
+
+def _all_kpis(today: date, start_7d: date, start_month: date, start_year: date, last_recompute):
+    """
+    7d / MTD / YTD KPI totals from daily_metrics (zeros if the aggregates are missing).
+    Cached per recompute stamp.
+    """
+    key = f"kpis:{last_recompute}:{today}:{start_7d}:{start_month}:{start_year}"
+    return _reports_cache.get_or_set(
+        key, lambda: _query_all_kpis(today, {"7d": start_7d, "mtd": start_month, "ytd": start_year})
+    )
 
-        rev = _safe_decimal(row.rev)
-        prof = _safe_decimal(row.profit)
-        disc_net = _safe_decimal(row.disc_net)
 
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
+def _query_all_kpis(today: date, period_starts: dict):
+    """
+    One daily_metrics scan with conditional SUMs per period (the ranges nest, except
+    that 7d can reach into the previous year). Returns {period: kpi dict}.
+    """
+    cols = []
+    for name, start in period_starts.items():
+        in_period = DailyMetric.metric_date >= start
+
+        def _sum(col):
+            return db.func.sum(db.case((in_period, col)))
+
+        cols += [
+            db.func.coalesce(_sum(DailyMetric.orders_count), 0).label(f"orders_{name}"),
+            db.func.coalesce(_sum(DailyMetric.units), 0).label(f"units_{name}"),
+            db.func.coalesce(_sum(DailyMetric.revenue_net), 0).label(f"rev_{name}"),
+            db.func.coalesce(_sum(DailyMetric.profit), 0).label(f"profit_{name}"),
+            db.func.coalesce(_sum(DailyMetric.discount_net), 0).label(f"disc_net_{name}"),
+            _margin_pct(_sum(DailyMetric.profit), _sum(DailyMetric.revenue_net)).label(f"margin_pct_{name}"),
+        ]
 
-        return {
-            "orders_count": int(row.orders or 0),
-            "units": int(row.units or 0),
-            "revenue_net": rev,
+    row = (
+        db.session.query(*cols)
+        .filter(DailyMetric.metric_date >= min(period_starts.values()))
+        .filter(DailyMetric.metric_date <= today)
+        .one()
+    )._mapping
+
+    kpis = {}
+    for name in period_starts:
+        prof = row[f"profit_{name}"]
+        disc_net = row[f"disc_net_{name}"]
+        kpis[name] = {
+            "orders_count": int(row[f"orders_{name}"] or 0),
+            "units": int(row[f"units_{name}"] or 0),
+            "revenue_net": row[f"rev_{name}"],
             "profit": prof,
-            "margin_pct": margin,
+            "margin_pct": row[f"margin_pct_{name}"],
             "discount_net": disc_net,
             "profit_no_discount": prof + disc_net,
         }
+    return kpis
+
+
+def _sku_widgets_mtd(start_month: date, today: date, last_recompute, margin_threshold: Decimal):
+    """
+    All MTD SKU widgets for the reports index from one sku_metrics_daily scan.
+    Cached per recompute stamp.
+    """
+    key = f"sku_widgets:{last_recompute}:{start_month}:{today}:{margin_threshold}"
+    return _reports_cache.get_or_set(key, lambda: _query_sku_widgets(start_month, today, margin_threshold))
 
-    kpi_7d = _kpi_from_daily(start_7d, today)
-    kpi_mtd = _kpi_from_daily(start_month, today)
-    kpi_ytd = _kpi_from_daily(start_year, today)
 
-    # Top sold items (MTD) from sku_metrics_daily
-    top_skus_units = (
+def _query_sku_widgets(start_month: date, today: date, margin_threshold: Decimal):
+    """
+    Returns dict with: top_units, top_discount (10 rows each), low_rows (worst 10
+    low-margin SKUs), neg_count, low_count.
+
+    The per-SKU rollup is ranked three ways with window functions, so only the
+    rows that make one of the top-10 lists come back (plus the counts).
+    """
+    rollup = (
         db.session.query(
-            SkuMetricDaily.sku,
+            SkuMetricDaily.sku.label("sku"),
             db.func.coalesce(db.func.sum(SkuMetricDaily.units), 0).label("units"),
             db.func.coalesce(db.func.sum(SkuMetricDaily.revenue_net), 0).label("rev"),
             db.func.coalesce(db.func.sum(SkuMetricDaily.profit), 0).label("profit"),
+            db.func.coalesce(db.func.sum(SkuMetricDaily.discount_net), 0).label("disc_net"),
         )
         .filter(SkuMetricDaily.metric_date >= start_month)
         .filter(SkuMetricDaily.metric_date <= today)
         .group_by(SkuMetricDaily.sku)
-        .order_by(db.desc(db.func.coalesce(db.func.sum(SkuMetricDaily.units), 0)))
-        .limit(10)
-        .all()
+        .subquery()
     )
 
-    # Biggest discount impact SKUs (MTD) — discount_net = profit lost to discounts (net)
-    top_discount_skus = (
+    margin = _margin_pct(rollup.c.profit, rollup.c.rev)
+    # margin < threshold without dividing: profit * 100 < rev * threshold (rev > 0)
+    is_low = db.case(
+        (db.and_(rollup.c.rev > 0, rollup.c.profit * 100 < rollup.c.rev * margin_threshold), 1),
+        else_=0,
+    )
+
+    ranked = (
         db.session.query(
-            SkuMetricDaily.sku,
-            db.func.coalesce(db.func.sum(SkuMetricDaily.units), 0).label("units"),
-            db.func.coalesce(db.func.sum(SkuMetricDaily.revenue_net), 0).label("rev"),
-            db.func.coalesce(db.func.sum(SkuMetricDaily.discount_net), 0).label("disc_net"),
+            rollup,
+            margin.label("margin"),
+            is_low.label("is_low"),
+            db.func.row_number().over(order_by=(rollup.c.units.desc(), rollup.c.sku)).label("rn_units"),
+            db.func.row_number().over(order_by=(rollup.c.disc_net.desc(), rollup.c.sku)).label("rn_disc"),
+            db.func.row_number().over(
+                order_by=(is_low.desc(), margin.asc(), rollup.c.profit.asc(), rollup.c.sku)
+            ).label("rn_low"),
+            db.func.sum(db.case((rollup.c.profit < 0, 1), else_=0)).over().label("neg_count"),
+            db.func.sum(is_low).over().label("low_count"),
         )
-        .filter(SkuMetricDaily.metric_date >= start_month)
-        .filter(SkuMetricDaily.metric_date <= today)
-        .group_by(SkuMetricDaily.sku)
-        .order_by(db.desc(db.func.coalesce(db.func.sum(SkuMetricDaily.discount_net), 0)))
-        .limit(10)
-        .all()
+        .subquery()
     )
 
-    # Low/negative margin SKUs (MTD)
-    sku_rollup = (
-        db.session.query(
-            SkuMetricDaily.sku,
-            db.func.coalesce(db.func.sum(SkuMetricDaily.revenue_net), 0).label("rev"),
-            db.func.coalesce(db.func.sum(SkuMetricDaily.profit), 0).label("profit"),
+    rows = (
+        db.session.query(ranked)
+        .filter(
+            db.or_(
+                ranked.c.rn_units <= 10,
+                ranked.c.rn_disc <= 10,
+                db.and_(ranked.c.is_low == 1, ranked.c.rn_low <= 10),
+            )
         )
-        .filter(SkuMetricDaily.metric_date >= start_month)
-        .filter(SkuMetricDaily.metric_date <= today)
-        .group_by(SkuMetricDaily.sku)
         .all()
     )
 
+    low_rows = [
+        {"sku": r.sku, "rev_net": r.rev, "profit": r.profit, "margin": r.margin}
+        for r in sorted((r for r in rows if r.is_low and r.rn_low <= 10), key=lambda r: r.rn_low)
+    ]
+
+    # Plain dicts (not Row objects) so the cached lists don't pin result metadata
+    def _top(rank_of):
+        return [
+            {"sku": r.sku, "units": int(r.units or 0), "rev": r.rev, "profit": r.profit, "disc_net": r.disc_net}
+            for r in sorted((r for r in rows if rank_of(r) <= 10), key=rank_of)
+        ]
+
+    return {
+        "top_units": _top(lambda r: r.rn_units),
+        "top_discount": _top(lambda r: r.rn_disc),
+        "low_rows": low_rows,
+        "neg_count": int(rows[0].neg_count or 0) if rows else 0,
+        "low_count": int(rows[0].low_count or 0) if rows else 0,
+    }
+
+
+def _build_index_context(today: date, last_recompute):
+    start_7d, start_month, start_year = _period_starts(today)
+
+    kpis = _all_kpis(today, start_7d, start_month, start_year, last_recompute)
+
+    # Top sold / biggest discount impact / low & negative margin SKUs (MTD)
     margin_threshold = Decimal("20")
-    neg_count = 0
-    low_count = 0
-    low_rows = []
-
-    for sku, rev_raw, prof_raw in sku_rollup:
-        rev = _safe_decimal(rev_raw)
-        prof = _safe_decimal(prof_raw)
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
-
-        if prof < 0:
-            neg_count += 1
-        if rev > 0 and margin < margin_threshold:
-            low_count += 1
-            low_rows.append({"sku": sku, "rev_net": rev, "profit": prof, "margin": margin})
-
-    low_rows.sort(key=lambda x: (float(x["margin"]), float(x["profit"])))
-    low_rows = low_rows[:10]
+    sku_widgets = _sku_widgets_mtd(start_month, today, last_recompute, margin_threshold)
 
-    return render_template(
-        "reports/index.html",
-        today=today.isoformat(),
-        kpi_7d=kpi_7d,
-        kpi_mtd=kpi_mtd,
-        kpi_ytd=kpi_ytd,
-        last_recompute=last_recompute,
-        top_skus_units=top_skus_units,
-        top_discount_skus=top_discount_skus,
-        low_margin_skus=low_rows,
-        neg_count=neg_count,
-        low_count=low_count,
-        margin_threshold=margin_threshold,
-    )
+    return {
+        "today": today.isoformat(),
+        "kpi_7d": kpis["7d"],
+        "kpi_mtd": kpis["mtd"],
+        "kpi_ytd": kpis["ytd"],
+        "last_recompute": last_recompute,
+        "top_skus_units": sku_widgets["top_units"],
+        "top_discount_skus": sku_widgets["top_discount"],
+        "low_margin_skus": sku_widgets["low_rows"],
+        "neg_count": sku_widgets["neg_count"],
+        "low_count": sku_widgets["low_count"],
+        "margin_threshold": margin_threshold,
+    }
+
+
+def _refresh_index_snapshot(app, today: date, last_recompute):
+    """
+    Background rebuild of the index snapshot; caller holds _index_refresh_lock.
+    """
+    try:
+        with app.app_context():
+            context = _build_index_context(today, last_recompute)
+            _index_snapshot["current"] = {"today": today, "version": last_recompute, "context": context}
+    except Exception:
+        app.logger.exception("Reports index refresh failed")
+    finally:
+        _index_refresh_lock.release()
+
+
+@reports_bp.get("")
+@login_required
+@require_role("viewer")
+def index():
+    today = g.today
+
+    # Last recompute info (also the cache version for the aggregate-table queries)
+    last_recompute = _last_recompute()
+
+    # Serve the last snapshot straight away, even if a recompute has happened since;
+    # one background thread per worker rebuilds it. Only a cold start (or a new day) renders synchronously.
+    snap = _index_snapshot.get("current")
+    if snap and snap["today"] == today:
+        if snap["version"] != last_recompute and _index_refresh_lock.acquire(blocking=False):
+            threading.Thread(
+                target=_refresh_index_snapshot,
+                args=(current_app._get_current_object(), today, last_recompute),
+                daemon=True,
+            ).start()
+        context = snap["context"]
+    else:
+        context = _build_index_context(today, last_recompute)
+        _index_snapshot["current"] = {"today": today, "version": last_recompute, "context": context}
+
+    return render_template("reports/index.html", **context)
 
 
 @reports_bp.get("/sales-summary")
 @login_required
 @require_role("viewer")
 def sales_summary():
-    today = datetime.utcnow().date()
-    start_month = today.replace(day=1)
-
-    d_from = _safe_date(request.args.get("from") or "") or start_month
-    d_to = _safe_date(request.args.get("to") or "") or today
+    d_from = _safe_date(request.args.get("from") or "") or g.start_month
+    d_to = _safe_date(request.args.get("to") or "") or g.today
     channel = (request.args.get("channel") or "").strip().lower()
 
     if d_from > d_to:
         flash("From date cannot be after To date.", "warning")
         return redirect(url_for("reports.sales_summary"))
 
-    # Base query for the selected range (optional channel)
-    base_q = (
-        db.session.query(SalesLine, SalesOrder)
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-        .filter(SalesOrder.order_date >= d_from)
-        .filter(SalesOrder.order_date <= d_to)
-    )
-    if channel:
-        base_q = base_q.filter(db.func.lower(SalesOrder.channel) == channel)
-
-    # KPI summary for selected range
-    kpi = _sum_sales_range(d_from, d_to) if not channel else _sum_sales_range(d_from, d_to)
-    # If channel is set, recompute KPI using channel filter (we need a channel-aware version)
-    if channel:
-        disc_gross = (
-            db.func.coalesce(SalesLine.line_discount_gross, 0) +
-            db.func.coalesce(SalesLine.order_discount_alloc_gross, 0)
-        )
-        vat_factor = db.literal(1) + (SalesLine.vat_rate / db.literal(100))
-        disc_net = disc_gross / vat_factor
-
-        row = (
-            db.session.query(
-                db.func.count(db.func.distinct(SalesOrder.id)).label("orders"),
-                db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
-                db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev_net"),
-                db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-                db.func.coalesce(db.func.sum(disc_gross), 0).label("disc_gross"),
-                db.func.coalesce(db.func.sum(disc_net), 0).label("disc_net"),
-            )
-            .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-            .filter(SalesOrder.order_date >= d_from)
-            .filter(SalesOrder.order_date <= d_to)
-            .filter(db.func.lower(SalesOrder.channel) == channel)
-            .one()
-        )
-
-        rev = _safe_decimal(row.rev_net)
-        prof = _safe_decimal(row.profit)
-        disc_net_val = _safe_decimal(row.disc_net)
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
-
-        kpi = {
-            "orders_count": int(row.orders or 0),
-            "units": int(row.units or 0),
-            "revenue_net": rev,
-            "profit": prof,
-            "margin_pct": margin,
-            "discount_gross": _safe_decimal(row.disc_gross),
-            "discount_net": disc_net_val,
-            "profit_no_discount": prof + disc_net_val,
-        }
+    # KPI summary for selected range (optional channel)
+    kpi = _sum_sales_range(d_from, d_to, channel or None)
 
     # Channel breakdown table (always useful, even if filtering on one channel)
-    ch_query = (
-        db.session.query(
-            SalesOrder.channel.label("channel"),
-            db.func.count(db.func.distinct(SalesOrder.id)).label("orders"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev_net"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-        .filter(SalesOrder.order_date >= d_from)
-        .filter(SalesOrder.order_date <= d_to)
-        .group_by(SalesOrder.channel)
-        .order_by(db.desc(db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0)))
-        .all()
-    )
+    ch_query = _channel_rows_query(d_from, d_to).all()
 
     # Channel dropdown values
-    channels = [r[0] for r in db.session.query(SalesOrder.channel).distinct().order_by(SalesOrder.channel.asc()).all()]
+    channels = sales_channels()
 
     return render_template(
         "reports/sales_summary.html",
@@ -337,85 +446,72 @@ def sales_summary():
 @login_required
 @require_role("viewer")
 def sales_summary_csv():
-    today = datetime.utcnow().date()
-    start_month = today.replace(day=1)
-
-    d_from = _safe_date(request.args.get("from") or "") or start_month
-    d_to = _safe_date(request.args.get("to") or "") or today
+    d_from = _safe_date(request.args.get("from") or "") or g.start_month
+    d_to = _safe_date(request.args.get("to") or "") or g.today
 
     channel = (request.args.get("channel") or "").strip().lower()
 
-    q = (
-        db.session.query(
-            SalesOrder.channel.label("channel"),
-            db.func.count(db.func.distinct(SalesOrder.id)).label("orders"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev_net"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-        .filter(SalesOrder.order_date >= d_from)
-        .filter(SalesOrder.order_date <= d_to)
+    rows = (
+        _channel_rows_query(d_from, d_to, channel or None)
+        .execution_options(stream_results=True)
+        .yield_per(500)
     )
-    if channel:
-        q = q.filter(db.func.lower(SalesOrder.channel) == channel)
-
-    rows = q.group_by(SalesOrder.channel).order_by(db.desc(db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0))).all()
-
-    # Simple CSV (small enough for v1; streaming is Phase 5)
-    import io, csv
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(["Channel", "Orders", "Units", "Revenue Net", "Profit", "Margin %"])
-
-    for r in rows:
-        rev = _safe_decimal(r.rev_net)
-        prof = _safe_decimal(r.profit)
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
 
-        w.writerow([
+    def row_fn(r):
+        return [
             r.channel,
             int(r.orders or 0),
             int(r.units or 0),
-            f"{rev:.2f}",
-            f"{prof:.2f}",
-            f"{margin:.2f}",
-        ])
-
-    return Response(
-        out.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=reports_sales_summary.csv"},
+            f"{r.rev_net:.2f}",
+            f"{r.profit:.2f}",
+            f"{r.margin_pct:.2f}",
+        ]
+
+    return stream_csv(
+        rows,
+        ["Channel", "Orders", "Units", "Revenue Net", "Profit", "Margin %"],
+        row_fn,
+        "reports_sales_summary.csv",
     )
 
 @reports_bp.get("/trends")
 @login_required
 @require_role("viewer")
 def trends():
-    today = datetime.utcnow().date()
-    default_from = today - timedelta(days=29)  # last 30 days
+    default_from = g.today - timedelta(days=29)  # last 30 days
 
     d_from = _safe_date(request.args.get("from") or "") or default_from
-    d_to = _safe_date(request.args.get("to") or "") or today
+    d_to = _safe_date(request.args.get("to") or "") or g.today
+
+    # Plain Row tuples (no ORM identity map / instrumentation) for the rendered columns
+    rows = db.session.execute(
+        db.select(
+            DailyMetric.metric_date,
+            DailyMetric.orders_count,
+            DailyMetric.units,
+            DailyMetric.revenue_net,
+            DailyMetric.cogs,
+            DailyMetric.profit,
+            DailyMetric.discount_net,
+        )
+        .where(DailyMetric.metric_date >= d_from)
+        .where(DailyMetric.metric_date <= d_to)
+        .order_by(DailyMetric.metric_date.asc())
+    ).all()
 
-    rows = (
-        DailyMetric.query
+    # Totals (summed in the DB rather than per row in Python)
+    totals = (
+        db.session.query(
+            db.func.coalesce(db.func.sum(DailyMetric.revenue_net), 0),
+            db.func.coalesce(db.func.sum(DailyMetric.profit), 0),
+            db.func.coalesce(db.func.sum(DailyMetric.discount_net), 0),
+            _margin_pct(db.func.sum(DailyMetric.profit), db.func.sum(DailyMetric.revenue_net)),
+        )
         .filter(DailyMetric.metric_date >= d_from)
         .filter(DailyMetric.metric_date <= d_to)
-        .order_by(DailyMetric.metric_date.asc())
-        .all()
+        .one()
     )
-
-    # Totals
-    total_rev = sum(Decimal(str(r.revenue_net or 0)) for r in rows)
-    total_profit = sum(Decimal(str(r.profit or 0)) for r in rows)
-    total_disc_net = sum(Decimal(str(r.discount_net or 0)) for r in rows)
-
-    total_margin = Decimal("0")
-    if total_rev > 0:
-        total_margin = (total_profit / total_rev) * Decimal("100")
+    total_rev, total_profit, total_disc_net, total_margin = totals
 
     return render_template(
         "reports/trends.html",
@@ -432,45 +528,44 @@ def trends():
 @login_required
 @require_role("viewer")
 def trends_csv():
-    today = datetime.utcnow().date()
-    default_from = today - timedelta(days=29)
+    default_from = g.today - timedelta(days=29)
 
     d_from = _safe_date(request.args.get("from") or "") or default_from
-    d_to = _safe_date(request.args.get("to") or "") or today
+    d_to = _safe_date(request.args.get("to") or "") or g.today
 
     rows = (
-        DailyMetric.query
+        db.session.query(
+            DailyMetric.metric_date,
+            DailyMetric.orders_count,
+            DailyMetric.units,
+            DailyMetric.revenue_net,
+            DailyMetric.cogs,
+            DailyMetric.profit,
+            _margin_pct(DailyMetric.profit, DailyMetric.revenue_net).label("margin_pct"),
+            DailyMetric.discount_net,
+        )
         .filter(DailyMetric.metric_date >= d_from)
         .filter(DailyMetric.metric_date <= d_to)
         .order_by(DailyMetric.metric_date.asc())
-        .all()
+        .execution_options(stream_results=True)
+        .yield_per(500)
     )
 
-    import io, csv
-    out = io.StringIO()
-    w = csv.writer(out)
-    w.writerow(["Date", "Orders", "Units", "Revenue Net", "COGS", "Profit", "Margin %", "Discount Net"])
-
-    for r in rows:
-        rev = Decimal(str(r.revenue_net or 0))
-        prof = Decimal(str(r.profit or 0))
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
-
-        w.writerow([
+    def row_fn(r):
+        return [
             r.metric_date.isoformat(),
             int(r.orders_count or 0),
             int(r.units or 0),
-            f"{rev:.2f}",
-            f"{Decimal(str(r.cogs or 0)):.2f}",
-            f"{prof:.2f}",
-            f"{margin:.2f}",
-            f"{Decimal(str(r.discount_net or 0)):.2f}",
-        ])
-
-    return Response(
-        out.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-Disposition": "attachment; filename=reports_trends.csv"},
+            f"{r.revenue_net:.2f}",
+            f"{r.cogs:.2f}",
+            f"{r.profit:.2f}",
+            f"{r.margin_pct:.2f}",
+            f"{r.discount_net:.2f}",
+        ]
+
+    return stream_csv(
+        rows,
+        ["Date", "Orders", "Units", "Revenue Net", "COGS", "Profit", "Margin %", "Discount Net"],
+        row_fn,
+        "reports_trends.csv",
     )
@@ -0,0 +1,77 @@
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from ..extensions import db
+from ..models import AppState, SalesLine, SalesLineSkuDaily, SalesOrder
+from ..utils.text_match import text_match
+
+# app_state keys present once a rollup table holds every sales line: set by the
+# DB patch backfill, or by an import into an empty sales_lines table. Until
+# then readers sum sales_lines live, since imports only add their own rows.
+CHANNEL_DAILY_READY_KEY = "daily_channel_metrics_ready"
+SKU_DAILY_READY_KEY = "sales_line_sku_daily_ready"
+
+
+def rollup_ready(key: str) -> bool:
+    return db.session.query(AppState.id).filter(AppState.key == key).first() is not None
+
+
+def mark_rollups_ready(*keys: str):
+    now = datetime.utcnow()
+    stamp = now.strftime("%Y-%m-%d %H:%M:%S UTC")
+    stmt = pg_insert(AppState).on_conflict_do_nothing(index_elements=["key"])
+    db.session.execute(stmt, [{"key": k, "value": stamp, "updated_at": now} for k in keys])
+
+
+def _sku_totals(sku, description, qty, revenue_net, cost_total, profit, line_discount, order_discount):
+    line_disc = db.func.coalesce(db.func.sum(line_discount), 0)
+    order_disc = db.func.coalesce(db.func.sum(order_discount), 0)
+    return db.select(
+        sku.label("sku"),
+        db.func.max(description).label("description"),
+        db.func.coalesce(db.func.sum(qty), 0).label("qty_sold"),
+        db.func.coalesce(db.func.sum(revenue_net), 0).label("revenue_net"),
+        db.func.coalesce(db.func.sum(cost_total), 0).label("cost_total"),
+        db.func.coalesce(db.func.sum(profit), 0).label("profit"),
+        line_disc.label("line_discount_gross"),
+        order_disc.label("order_discount_alloc_gross"),
+        (line_disc + order_disc).label("discount_gross"),
+    )
+
+
+def sku_aggregate_select(q, channel, date_from, date_to):
+    """
+    Per-SKU sales totals for the discount report and alerts (pages + CSVs).
+
+    Reads the pre-summed sales_line_sku_daily rows (one per sku/day/channel),
+    so no sales_lines scan or join. A text search (q matches each line's own
+    description) or a summary not yet backfilled falls back to summing
+    sales_lines live. Returns a Core select grouped by sku; callers add
+    ordering/limits or wrap it as a subquery.
+    """
+    if q or not rollup_ready(SKU_DAILY_READY_KEY):
+        L, O = SalesLine, SalesOrder
+        stmt = _sku_totals(
+            L.sku, L.description, L.qty, L.revenue_net, L.cost_total, L.profit,
+            L.line_discount_gross, L.order_discount_alloc_gross,
+        ).join(O, L.sales_order_id == O.id)
+        if q:
+            stmt = stmt.where(db.or_(text_match(L.sku, q), text_match(L.description, q)))
+        sku, channel_col, date_col = L.sku, O.channel, O.order_date
+    else:
+        S = SalesLineSkuDaily
+        stmt = _sku_totals(
+            S.sku, S.description, S.qty, S.revenue_net, S.cost_total, S.profit,
+            S.line_discount_gross, S.order_discount_alloc_gross,
+        )
+        sku, channel_col, date_col = S.sku, S.channel, S.order_date
+
+    if channel:
+        stmt = stmt.where(db.func.lower(channel_col) == channel)
+    if date_from:
+        stmt = stmt.where(date_col >= date_from)
+    if date_to:
+        stmt = stmt.where(date_col <= date_to)
+
+    return stmt.group_by(sku)
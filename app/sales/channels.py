@@ -0,0 +1,46 @@
+from sqlalchemy import text
+
+from ..extensions import db
+from ..utils.cache import TTLCache
+
+
+# Shared by the sales pages and reports dropdowns (per worker). Channels only
+# appear through the sales import, which calls invalidate_channels(); the TTL
+# bounds how long other workers keep a list that predates a new channel.
+_channels_cache = TTLCache(ttl_seconds=300, max_items=4)
+_CHANNELS_KEY = "channels"
+
+# Loose index scan: one MIN(channel) > previous lookup per distinct channel, so the
+# ix_sales_orders_channel btree is probed O(channels) times instead of DISTINCT reading every order.
+_DISTINCT_CHANNELS_SQL = text("""
+    WITH RECURSIVE t(channel) AS (
+      SELECT MIN(channel) FROM sales_orders
+      UNION ALL
+      SELECT (SELECT MIN(so.channel) FROM sales_orders so WHERE so.channel > t.channel)
+      FROM t
+      WHERE t.channel IS NOT NULL
+    )
+    SELECT channel FROM t WHERE channel IS NOT NULL ORDER BY channel
+""")
+
+
+def channels():
+    """
+    Distinct sales order channels (sorted) for filter dropdowns.
+    """
+    return _channels_cache.get_or_set(
+        _CHANNELS_KEY,
+        lambda: [r[0] for r in db.session.execute(_DISTINCT_CHANNELS_SQL).fetchall()],
+    )
+
+
+def invalidate_channels(inserted=None):
+    """
+    Drop the cached list after orders were written. With `inserted` (channels of
+    the new orders) it is only dropped when one of them is not already listed.
+    """
+    cached = _channels_cache.get(_CHANNELS_KEY)
+    if cached is None:
+        return
+    if inserted is None or not set(inserted).issubset(cached):
+        _channels_cache.delete(_CHANNELS_KEY)
@@ -1,15 +1,34 @@
 import csv
 import io
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
+import os
+import shutil
+import tempfile
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
 from urllib.parse import urlencode
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, Response
+from flask import Blueprint, current_app, render_template, redirect, url_for, flash, request, Response
 from flask_login import login_required, current_user
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import load_only
 
 from ..extensions import db
 from ..decorators import require_role, require_edit_permission
-from ..utils.csv_stream import stream_csv
+from ..utils.csv_headers import norm_header as _norm_header
+from ..utils.csv_stream import stream_csv, stream_csv_fast
+from ..utils.dates import parse_date
+from ..utils.numbers import to_decimal as _d
+from ..utils.text_match import text_match
+from ._aggregates import (
+    CHANNEL_DAILY_READY_KEY,
+    SKU_DAILY_READY_KEY,
+    mark_rollups_ready,
+    sku_aggregate_select,
+)
+from .channels import channels as sales_channels, invalidate_channels
 from ..models import (
     Item,
     ImportBatch,
@@ -18,6 +37,8 @@ from ..models import (
     PurchaseOrder,
     PurchaseLine,
     SavedSearch,
+    SalesLineSkuDaily,
+    DailyChannelMetric,
 )
 
 sales_bp = Blueprint("sales", __name__, url_prefix="/sales")
@@ -68,10 +89,6 @@ def _validate_headers(fieldnames, expected_headers):
 # Helpers (CSV + parsing)
 # -------------------------
 
-def _norm_header(s: str) -> str:
-    return "".join(ch.lower() for ch in (s or "").strip() if ch.isalnum())
-
-
 def _pick(row: dict, header_map: dict, *keys: str) -> str:
     for k in keys:
         h = header_map.get(_norm_header(k))
@@ -80,15 +97,24 @@ def _pick(row: dict, header_map: dict, *keys: str) -> str:
     return ""
 
 
-def _safe_decimal(val, default=Decimal("0")):
+_ZERO = Decimal("0")
+_COMMA_TO_DOT = str.maketrans({",": "."})
+_Q4 = Decimal("0.0001")
+
+
+def _comma_to_dot(s: str) -> str:
+    # Decimal commas are rare: only translate when one is present
+    return s.translate(_COMMA_TO_DOT) if "," in s else s
+
+
+def _safe_decimal(val, default=_ZERO):
     if val is None:
         return default
     s = str(val).strip()
     if s == "":
         return default
-    s = s.replace(",", ".")
     try:
-        return Decimal(s)
+        return Decimal(_comma_to_dot(s))
     except InvalidOperation:
         return default
 
@@ -98,7 +124,7 @@ def _safe_int(val, default=0):
         s = str(val).strip()
         if s == "":
             return default
-        return int(Decimal(s.replace(",", ".")))
+        return int(Decimal(_comma_to_dot(s)))
     except Exception:
         return default
 
@@ -110,21 +136,22 @@ def _safe_date(val):
     s = (val or "").strip()
     if not s:
         return None
+    return parse_date(s)
 
-    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
-        try:
-            return datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
-    return None
+
+@lru_cache(maxsize=64)
+def _vat_factor(vat_rate) -> Decimal:
+    """
+    1 + vat/100, computed once per distinct VAT rate.
+    """
+    return Decimal("1.0") + (Decimal(str(vat_rate)) / Decimal("100.0"))
 
 
 def _gross_to_net(gross: Decimal, vat_rate: Decimal) -> Decimal:
     """
     Malta: prices are VAT-inclusive. net = gross / (1 + vat/100)
     """
-    vr = vat_rate if vat_rate is not None else Decimal("18.00")
-    factor = Decimal("1.0") + (Decimal(str(vr)) / Decimal("100.0"))
+    factor = _vat_factor(vat_rate if vat_rate is not None else Decimal("18.00"))
     if factor <= 0:
         return gross
     return (gross / factor)
@@ -148,13 +175,76 @@ def _line_landed_cost(pl: PurchaseLine) -> Decimal:
     Prefer landed_unit_cost. If missing, fallback to unit_cost_net + packaging_per_unit.
     """
     if pl.landed_unit_cost is not None:
-        return Decimal(str(pl.landed_unit_cost))
-    unit = Decimal(str(pl.unit_cost_net or 0))
-    pkg = Decimal(str(pl.packaging_per_unit or 0))
-    return unit + pkg
+        return _d(pl.landed_unit_cost)
+    return _d(pl.unit_cost_net) + _d(pl.packaging_per_unit)
 
 
-def _compute_unit_cost_basis(sku: str, sale_date, method: str):
+def _build_cost_index(skus):
+    """
+    Load every purchase line for `skus` in one query and pre-aggregate per SKU.
+    Dated purchases are sorted by effective date with running qty / qty*cost totals,
+    so each cost lookup is a bisect rather than a scan over the SKU's history.
+    Returns: {sku: {"dated", "dates", "cum_qty", "cum_cost", "undated", "total_qty", "total_cost"}}
+    where purchase entries are (effective_date, po_id, qty, landed_unit_cost), qty > 0 only.
+    """
+    cost_index = {}
+    skus = {s for s in skus if s}
+    if not skus:
+        return cost_index
+
+    # Scalar columns only: rows carry the attributes _effective_po_date /
+    # _line_landed_cost read, without hydrating PurchaseLine/PurchaseOrder entities
+    rows = db.session.execute(
+        db.select(
+            PurchaseLine.sku,
+            PurchaseLine.qty,
+            PurchaseLine.landed_unit_cost,
+            PurchaseLine.unit_cost_net,
+            PurchaseLine.packaging_per_unit,
+            PurchaseOrder.id.label("po_id"),
+            PurchaseOrder.arrival_date,
+            PurchaseOrder.order_date,
+            PurchaseOrder.created_at,
+        )
+        .join(PurchaseOrder, PurchaseLine.purchase_order_id == PurchaseOrder.id)
+        .where(PurchaseLine.sku.in_(skus))
+        .order_by(PurchaseLine.id)
+    ).all()
+
+    by_sku = {}
+    for r in rows:
+        qty = int(r.qty or 0)
+        if qty <= 0:
+            continue
+        by_sku.setdefault(r.sku, []).append(
+            (_effective_po_date(r), r.po_id, qty, _line_landed_cost(r))
+        )
+
+    for sku, entries in by_sku.items():
+        # Stable sort: purchases sharing a date keep their line order
+        dated = sorted((e for e in entries if e[0] is not None), key=lambda e: e[0])
+        cum_qty = []
+        cum_cost = []
+        run_qty = 0
+        run_cost = _ZERO
+        for _, _, qty, cost in dated:
+            run_qty += qty
+            run_cost += qty * cost
+            cum_qty.append(run_qty)
+            cum_cost.append(run_cost)
+        cost_index[sku] = {
+            "dated": dated,
+            "dates": [e[0] for e in dated],
+            "cum_qty": cum_qty,
+            "cum_cost": cum_cost,
+            "undated": [e for e in entries if e[0] is None],
+            "total_qty": sum(qty for _, _, qty, _ in entries),
+            "total_cost": sum((qty * cost for _, _, qty, cost in entries), _ZERO),
+        }
+    return cost_index
+
+
+def _compute_from_index(cost_index: dict, sku: str, sale_date, method: str):
     """
     method:
       - 'weighted_avg': weighted average landed unit cost for purchases with effective_date <= sale_date
@@ -162,56 +252,81 @@ def _compute_unit_cost_basis(sku: str, sale_date, method: str):
     Fallbacks:
       - if no purchases before sale_date, use latest purchase overall
       - if no purchases at all, return (0, None)
+    `cost_index` comes from _build_cost_index().
     Returns: (unit_cost_basis: Decimal, cost_source_po_id: int|None)
     """
     sku = (sku or "").strip()
     if not sku:
         return (Decimal("0"), None)
 
-    rows = (
-        db.session.query(PurchaseLine, PurchaseOrder)
-        .join(PurchaseOrder, PurchaseLine.purchase_order_id == PurchaseOrder.id)
-        .filter(PurchaseLine.sku == sku)
-        .all()
-    )
-
-    if not rows:
+    entry = cost_index.get(sku)
+    if not entry:
         return (Decimal("0"), None)
 
-    enriched = []
-    for pl, po in rows:
-        eff = _effective_po_date(po)
-        qty = int(pl.qty or 0)
-        if qty <= 0:
-            continue
-        cost = _line_landed_cost(pl)
-        enriched.append((eff, po.id, qty, cost))
-
-    if not enriched:
-        return (Decimal("0"), None)
-
-    before = [r for r in enriched if r[0] is not None and sale_date is not None and r[0] <= sale_date]
-    candidates = before if before else enriched
-
-    candidates_sorted = sorted(
-        candidates,
-        key=lambda x: (x[0] is None, x[0]),
-        reverse=True,
-    )
+    dated = entry["dated"]
+    dates = entry["dates"]
+    # Number of dated purchases on or before the sale date
+    k = bisect_right(dates, sale_date) if sale_date is not None else 0
 
     if (method or "weighted_avg") == "last":
-        eff, po_id, qty, cost = candidates_sorted[0]
-        return (Decimal(str(cost)), int(po_id) if po_id else None)
-
-    total_qty = sum(Decimal(qty) for _, _, qty, _ in candidates)
+        if k:
+            pick = dated[bisect_left(dates, dates[k - 1])]
+        elif entry["undated"]:
+            pick = entry["undated"][0]
+        else:
+            pick = dated[bisect_left(dates, dates[-1])]
+        eff, po_id, qty, cost = pick
+        return (cost, int(po_id) if po_id else None)
+
+    if k:
+        total_qty, total_cost = entry["cum_qty"][k - 1], entry["cum_cost"][k - 1]
+    else:
+        total_qty, total_cost = entry["total_qty"], entry["total_cost"]
     if total_qty <= 0:
         return (Decimal("0"), None)
 
-    total_cost = sum(Decimal(qty) * Decimal(str(cost)) for _, _, qty, cost in candidates)
-    avg = total_cost / total_qty
+    avg = total_cost / Decimal(total_qty)
     return (avg, None)
 
 
+def _sku_alerts_query(q, channel, date_from, date_to, margin_threshold, discount_threshold):
+    """
+    Per-SKU totals with margin %, discount % and the three alert flags computed
+    in SQL; only SKUs that raise at least one flag are returned.
+    """
+    agg = sku_aggregate_select(q, channel, date_from, date_to).subquery()
+    rev = agg.c.revenue_net
+    disc = agg.c.discount_gross
+    rev_gross = rev * db.literal(Decimal("1.18"))
+    # Divisors are cast to their own type: plain NUMERIC, not the NUMERIC(12, 4) column type
+    margin_pct = db.case((rev > 0, agg.c.profit * 100 / db.type_coerce(rev, db.Numeric)), else_=0)
+    discount_pct = db.case((rev > 0, disc * 100 / rev_gross), else_=0)
+
+    # Thresholds compared without dividing: profit * 100 < rev * threshold (rev > 0)
+    is_negative = agg.c.profit < 0
+    is_low_margin = db.and_(rev > 0, agg.c.profit * 100 < rev * margin_threshold)
+    over_discount = db.and_(rev > 0, disc * 100 > rev_gross * discount_threshold)
+    if discount_threshold < 0:
+        # Without revenue discount % counts as 0, which still exceeds a negative threshold
+        over_discount = db.or_(over_discount, rev <= 0)
+    is_high_discount = db.and_(disc > 0, over_discount)
+
+    return db.select(
+        agg.c.sku,
+        agg.c.description,
+        agg.c.qty_sold,
+        agg.c.revenue_net,
+        agg.c.cost_total,
+        agg.c.profit,
+        margin_pct.label("margin_pct"),
+        agg.c.discount_gross,
+        discount_pct.label("discount_pct"),
+        db.case((is_negative, 1), else_=0).label("flag_negative"),
+        db.case((is_low_margin, 1), else_=0).label("flag_low_margin"),
+        db.case((is_high_discount, 1), else_=0).label("flag_high_discount"),
+    ).where(db.or_(is_negative, is_low_margin, is_high_discount))
+
+
 # -------------------------
 # Views
 # -------------------------
@@ -237,9 +352,9 @@ def list_sales_orders():
     if q:
         query = query.filter(
             db.or_(
-                db.func.lower(SalesOrder.order_number).contains(q),
-                db.func.lower(SalesOrder.customer_name).contains(q),
-                db.func.lower(SalesOrder.customer_email).contains(q),
+                text_match(SalesOrder.order_number, q),
+                text_match(SalesOrder.customer_name, q),
+                text_match(SalesOrder.customer_email, q),
             )
         )
 
@@ -251,9 +366,23 @@ def list_sales_orders():
     if date_to:
         query = query.filter(SalesOrder.order_date <= date_to)
 
-    total = query.count()
+    # Plain COUNT(id) over the filtered table (Query.count() wraps the full entity select)
+    total = query.with_entities(db.func.count(SalesOrder.id)).scalar() or 0
+    # Only the columns the list renders; totals are stored on the order at import time
     orders = (
-        query.order_by(SalesOrder.order_date.desc(), SalesOrder.id.desc())
+        query.options(
+            load_only(
+                SalesOrder.id,
+                SalesOrder.order_number,
+                SalesOrder.order_date,
+                SalesOrder.channel,
+                SalesOrder.currency,
+                SalesOrder.total_revenue_net,
+                SalesOrder.total_profit,
+                SalesOrder.total_units,
+            )
+        )
+        .order_by(SalesOrder.order_date.desc(), SalesOrder.id.desc())
         .offset((page - 1) * per_page)
         .limit(per_page)
         .all()
@@ -261,13 +390,7 @@ def list_sales_orders():
 
 
     # Distinct channels for dropdown
-    channels = [
-        r[0]
-        for r in db.session.query(SalesOrder.channel)
-        .distinct()
-        .order_by(SalesOrder.channel.asc())
-        .all()
-    ]
+    channels = sales_channels()
 
     # Saved searches (user-scoped)
     saved = (
@@ -278,27 +401,6 @@ def list_sales_orders():
         .all()
     )
 
-    # Totals per order (single grouped query)
-    order_ids = [o.id for o in orders]
-    totals_map = {}
-    if order_ids:
-        totals = (
-            db.session.query(
-                SalesLine.sales_order_id,
-                db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0),
-                db.func.coalesce(db.func.sum(SalesLine.cost_total), 0),
-                db.func.coalesce(db.func.sum(SalesLine.profit), 0),
-                db.func.coalesce(db.func.sum(SalesLine.qty), 0),
-            )
-            .filter(SalesLine.sales_order_id.in_(order_ids))
-            .group_by(SalesLine.sales_order_id)
-            .all()
-        )
-        totals_map = {
-            oid: {"rev": rev, "cost": cost, "profit": prof, "units": units}
-            for oid, rev, cost, prof, units in totals
-        }
-
     # Pagination helpers for template
     has_prev = page > 1
     has_next = (page * per_page) < total
@@ -319,7 +421,6 @@ def list_sales_orders():
         date_from=(date_from.isoformat() if date_from else ""),
         date_to=(date_to.isoformat() if date_to else ""),
         channels=channels,
-        totals_map=totals_map,
         page=page,
         per_page=per_page,
         total=total,
@@ -341,24 +442,25 @@ def sales_order_detail(order_id: int):
 
     lines = SalesLine.query.filter_by(sales_order_id=so.id).order_by(SalesLine.sku.asc()).all()
 
-    total_units = sum(l.qty or 0 for l in lines)
-    total_rev_net = sum(Decimal(str(l.revenue_net or 0)) for l in lines)
-    total_cost = sum(Decimal(str(l.cost_total or 0)) for l in lines)
-    total_profit = sum(Decimal(str(l.profit or 0)) for l in lines)
-
-    # Discount analytics
-    total_discount_gross = sum(
-        Decimal(str((l.line_discount_gross or 0))) + Decimal(str((l.order_discount_alloc_gross or 0)))
-        for l in lines
-    )
-
-    total_discount_net = sum(
-        _gross_to_net(
-            Decimal(str((l.line_discount_gross or 0))) + Decimal(str((l.order_discount_alloc_gross or 0))),
-            Decimal(str(l.vat_rate or Decimal("18.00"))),
-        )
-        for l in lines
-    )
+    # Numeric columns already come back as Decimal; one pass, no str() round-trips
+    total_units = 0
+    total_rev_net = Decimal("0")
+    total_cost = Decimal("0")
+    total_profit = Decimal("0")
+    total_discount_gross = Decimal("0")
+    total_discount_net = Decimal("0")
+    for l in lines:
+        total_units += l.qty or 0
+        # NULL -> shared Decimal zero: keeps every add Decimal + Decimal (no int coercion)
+        total_rev_net += l.revenue_net or _ZERO
+        total_cost += l.cost_total or _ZERO
+        total_profit += l.profit or _ZERO
+
+        # Discount analytics (most lines carry no discount: skip the VAT division)
+        disc_gross = (l.line_discount_gross or _ZERO) + (l.order_discount_alloc_gross or _ZERO)
+        if disc_gross:
+            total_discount_gross += disc_gross
+            total_discount_net += _gross_to_net(disc_gross, l.vat_rate or Decimal("18.00"))
 
     profit_no_discount = (total_rev_net + total_discount_net) - total_cost
     profit_lost_to_discounts = profit_no_discount - total_profit
@@ -387,116 +489,102 @@ def sales_order_detail(order_id: int):
 # Import (Upload -> Preview -> Commit)
 # -------------------------
 
-@sales_bp.get("/import")
-@login_required
-@require_edit_permission
-def import_upload():
-    return render_template(
-        "sales/import_upload.html",
-        expected_headers=SALES_IMPORT_HEADERS,
-        header_issues=None,
-        row_errors=None,
-    )
-
+# Validation stops collecting after this many row errors
+_MAX_ROW_ERRORS = 500
 
-@sales_bp.post("/import")
-@login_required
-@require_edit_permission
-def import_parse():
-    f = request.files.get("file")
-    if not f or f.filename == "":
-        flash("Please choose a CSV file.", "danger")
-        return redirect(url_for("sales.import_upload"))
-
-    raw = f.read()
-    try:
-        text = raw.decode("utf-8-sig")
-    except UnicodeDecodeError:
-        flash("CSV must be UTF-8 encoded.", "danger")
-        return redirect(url_for("sales.import_upload"))
-
-    reader = csv.DictReader(io.StringIO(text))
-    if not reader.fieldnames:
-        flash("CSV appears empty or invalid.", "danger")
-        return redirect(url_for("sales.import_upload"))
-
-    ok_headers, missing, extra, given = _validate_headers(reader.fieldnames, SALES_IMPORT_HEADERS)
-    if not ok_headers:
-        return render_template(
-            "sales/import_upload.html",
-            expected_headers=SALES_IMPORT_HEADERS,
-            header_issues={"missing": missing, "extra": extra, "given": given},
-            row_errors=None,
-        )
 
-    rows = list(reader)
+def _parse_sales_rows(reader, given):
+    """
+    Single pass over the data rows of a sales import: validates each row and,
+    while no errors have been seen, groups lines into orders by (channel, order_number).
+    Returns: (groups: dict, errors: list)
+    """
+    # Positional access: column indices are resolved once, rows stay plain lists
+    col = {h: i for i, h in enumerate(given)}
+    i_order_number = col["Order Number"]
+    i_order_date = col["Order Date"]
+    i_channel = col["Channel"]
+    i_currency = col["Currency"]
+    i_customer_name = col["Customer Name"]
+    i_customer_email = col["Customer Email"]
+    i_shipping = col["Shipping Charged Gross"]
+    i_order_discount = col["Order Discount Gross"]
+    i_sku = col["SKU"]
+    i_desc = col["Item Description"]
+    i_qty = col["Qty"]
+    i_unit_price = col["Unit Price Gross"]
+    i_line_discount = col["Line Discount Gross"]
+    optional_decimals = (
+        ("Shipping Charged Gross", i_shipping),
+        ("Order Discount Gross", i_order_discount),
+        ("Line Discount Gross", i_line_discount),
+    )
 
-    # Strict row validation (fail-fast: do not create an ImportBatch if any errors)
+    width = len(given)
+    groups = {}
     errors = []
-    for i, r in enumerate(rows, start=2):
-        order_number = (r.get("Order Number") or "").strip()
-        order_date_raw = (r.get("Order Date") or "").strip()
-        sku = (r.get("SKU") or "").strip()
-        qty_raw = (r.get("Qty") or "").strip()
-        unit_price_raw = (r.get("Unit Price Gross") or "").strip()
+    i = 1
+    for r in reader:
+        if not r:
+            continue
+        i += 1
+        if len(r) < width:
+            r.extend([""] * (width - len(r)))
+
+        order_number = r[i_order_number].strip()
+        order_date_raw = r[i_order_date].strip()
+        sku = r[i_sku].strip()
+        qty_raw = r[i_qty].strip()
+        unit_price_raw = r[i_unit_price].strip()
 
         if not order_number:
             errors.append({"row": i, "field": "Order Number", "issue": "required", "value": ""})
         if not sku:
             errors.append({"row": i, "field": "SKU", "issue": "required", "value": ""})
 
-        if not order_date_raw or not _safe_date(order_date_raw):
+        order_date = _safe_date(order_date_raw) if order_date_raw else None
+        if not order_date:
             errors.append({"row": i, "field": "Order Date", "issue": "invalid date (use YYYY-MM-DD or DD/MM/YYYY)", "value": order_date_raw})
 
         try:
-            qty_val = int(Decimal(qty_raw.replace(",", "."))) if qty_raw != "" else 0
+            qty_val = int(Decimal(_comma_to_dot(qty_raw))) if qty_raw != "" else 0
             if qty_val <= 0:
                 raise ValueError("qty must be > 0")
         except Exception:
             errors.append({"row": i, "field": "Qty", "issue": "invalid integer > 0", "value": qty_raw})
 
         try:
-            up = Decimal(unit_price_raw.replace(",", "."))
+            up = Decimal(_comma_to_dot(unit_price_raw))
             if up <= 0:
                 raise ValueError("unit price must be > 0")
         except Exception:
             errors.append({"row": i, "field": "Unit Price Gross", "issue": "invalid decimal > 0", "value": unit_price_raw})
 
-        for fld in ("Shipping Charged Gross", "Order Discount Gross", "Line Discount Gross"):
-            v = (r.get(fld) or "").strip()
+        for fld, i_fld in optional_decimals:
+            v = r[i_fld].strip()
             if v:
                 try:
-                    Decimal(v.replace(",", "."))
+                    Decimal(_comma_to_dot(v))
                 except Exception:
                     errors.append({"row": i, "field": fld, "issue": "invalid decimal", "value": v})
 
-    if errors:
-        return render_template(
-            "sales/import_upload.html",
-            expected_headers=SALES_IMPORT_HEADERS,
-            header_issues=None,
-            row_errors=errors,
-        )
-
-    groups = {}
-    for r in rows:
-        order_number = (r.get("Order Number") or "").strip()
-        order_date = _safe_date((r.get("Order Date") or "").strip())
-        channel = (r.get("Channel") or "unknown").strip().lower() or "unknown"
-        currency = (r.get("Currency") or "EUR").strip().upper() or "EUR"
+        if errors:
+            # The batch will be rejected; keep validating but skip grouping
+            if len(errors) >= _MAX_ROW_ERRORS:
+                break
+            continue
 
-        customer_name = (r.get("Customer Name") or "").strip() or None
-        customer_email = (r.get("Customer Email") or "").strip() or None
+        channel = (r[i_channel] or "unknown").strip().lower() or "unknown"
+        currency = (r[i_currency] or "EUR").strip().upper() or "EUR"
 
-        shipping = (r.get("Shipping Charged Gross") or "").strip()
-        order_discount = (r.get("Order Discount Gross") or "").strip()
+        customer_name = r[i_customer_name].strip() or None
+        customer_email = r[i_customer_email].strip() or None
 
-        sku = (r.get("SKU") or "").strip()
-        desc = (r.get("Item Description") or "").strip() or None
+        shipping = r[i_shipping].strip()
+        order_discount = r[i_order_discount].strip()
 
-        qty = (r.get("Qty") or "").strip()
-        unit_price_gross = (r.get("Unit Price Gross") or "").strip()
-        line_discount_gross = (r.get("Line Discount Gross") or "").strip()
+        desc = r[i_desc].strip() or None
+        line_discount_gross = r[i_line_discount].strip()
 
         key = (channel, order_number)
         if key not in groups:
@@ -507,36 +595,89 @@ def import_parse():
                 "currency": currency,
                 "customer_name": customer_name,
                 "customer_email": customer_email,
-                "shipping_charged_gross": str(Decimal(shipping.replace(",", "."))) if shipping else None,
-                "order_discount_gross": str(Decimal(order_discount.replace(",", "."))) if order_discount else None,
+                "shipping_charged_gross": str(Decimal(_comma_to_dot(shipping))) if shipping else None,
+                "order_discount_gross": str(Decimal(_comma_to_dot(order_discount))) if order_discount else None,
                 "lines": [],
             }
         else:
             if shipping and not groups[key].get("shipping_charged_gross"):
-                groups[key]["shipping_charged_gross"] = str(Decimal(shipping.replace(",", ".")))
+                groups[key]["shipping_charged_gross"] = str(Decimal(_comma_to_dot(shipping)))
             if order_discount and not groups[key].get("order_discount_gross"):
-                groups[key]["order_discount_gross"] = str(Decimal(order_discount.replace(",", ".")))
+                groups[key]["order_discount_gross"] = str(Decimal(_comma_to_dot(order_discount)))
 
         groups[key]["lines"].append(
             {
                 "sku": sku,
                 "description": desc,
-                "qty": qty,
-                "unit_price_gross": unit_price_gross,
+                "qty": qty_raw,
+                "unit_price_gross": unit_price_raw,
                 "line_discount_gross": line_discount_gross or "0",
             }
         )
 
+    return groups, errors
+
+
+@sales_bp.get("/import")
+@login_required
+@require_edit_permission
+def import_upload():
+    return render_template(
+        "sales/import_upload.html",
+        expected_headers=SALES_IMPORT_HEADERS,
+        header_issues=None,
+        row_errors=None,
+    )
+
+
+# Uploads larger than this are parsed in a background thread (the request returns at once)
+_ASYNC_PARSE_BYTES = 512 * 1024
+# A batch still 'parsing' this long after upload (batch created_at) lost its worker
+_PARSE_STALE_AFTER = timedelta(minutes=15)
+
+
+def _parse_sales_upload(text_stream):
+    """
+    Parse + validate a sales CSV (text stream) into an import payload.
+    Returns one of:
+      {"error": message}            - unreadable / empty / nothing to import
+      {"header_issues": {...}}      - header mismatch
+      {"row_errors": [...]}         - strict row validation failed
+      {"payload": {...}}            - ready for preview
+    """
+    reader = csv.reader(text_stream)
+    try:
+        fieldnames = next(reader, None)
+        if not fieldnames:
+            return {"error": "CSV appears empty or invalid."}
+
+        ok_headers, missing, extra, given = _validate_headers(fieldnames, SALES_IMPORT_HEADERS)
+        if not ok_headers:
+            return {"header_issues": {"missing": missing, "extra": extra, "given": given}}
+
+        groups, errors = _parse_sales_rows(reader, given)
+    except UnicodeDecodeError:
+        return {"error": "CSV must be UTF-8 encoded."}
+
+    # Strict row validation (fail-fast: nothing is importable if any errors)
+    if errors:
+        return {"row_errors": errors}
+
     if not groups:
-        flash("No orders detected. Ensure your CSV includes an order number and SKU columns.", "danger")
-        return redirect(url_for("sales.import_upload"))
+        return {"error": "No orders detected. Ensure your CSV includes an order number and SKU columns."}
 
-    missing_skus = set()
-    for g in groups.values():
-        for ln in g["lines"]:
-            s = (ln.get("sku") or "").strip()
-            if s and not Item.query.filter_by(sku=s).first():
-                missing_skus.add(s)
+    all_skus = {
+        (ln.get("sku") or "").strip()
+        for g in groups.values()
+        for ln in g["lines"]
+    }
+    all_skus.discard("")
+    existing_skus = set()
+    if all_skus:
+        existing_skus = {
+            sku for (sku,) in Item.query.with_entities(Item.sku).filter(Item.sku.in_(all_skus)).all()
+        }
+    missing_skus = all_skus - existing_skus
 
     payload = {
         "orders": list(groups.values()),
@@ -549,8 +690,94 @@ def import_parse():
             "skipped_no_sku": 0,
         },
     }
+    return {"payload": payload}
+
+
+def _parse_sales_import_job(app, batch_id: int, path: str):
+    """
+    Background parse of a large upload saved at `path`; fills the batch payload and
+    flips its status to 'ready' (or 'failed', keeping the errors in the payload).
+    """
+    try:
+        with app.app_context():
+            batch = db.session.get(ImportBatch, batch_id)
+            if not batch or batch.status != "parsing":
+                return
+            try:
+                with open(path, encoding="utf-8-sig", newline="") as fh:
+                    result = _parse_sales_upload(fh)
+            except Exception:
+                app.logger.exception("Sales import parse failed (batch %s)", batch_id)
+                db.session.rollback()
+                result = {"error": "Could not parse the uploaded CSV."}
+
+            db.session.refresh(batch)
+            if batch.status != "parsing":
+                # Marked stale by the preview page meanwhile; keep that outcome
+                return
+            if "payload" in result:
+                batch.payload = result["payload"]
+                batch.status = "ready"
+            else:
+                batch.payload = result
+                batch.status = "failed"
+            db.session.commit()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+@sales_bp.post("/import")
+@login_required
+@require_edit_permission
+def import_parse():
+    f = request.files.get("file")
+    if not f or f.filename == "":
+        flash("Please choose a CSV file.", "danger")
+        return redirect(url_for("sales.import_upload"))
 
-    batch = ImportBatch(kind="sales_import", filename=f.filename, payload=payload)
+    if (request.content_length or 0) > _ASYNC_PARSE_BYTES:
+        # Large upload: spool to disk, parse off-request, preview polls the batch status
+        fd, path = tempfile.mkstemp(prefix="sales_import_", suffix=".csv")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                shutil.copyfileobj(f.stream, out)
+
+            batch = ImportBatch(kind="sales_import", filename=f.filename, payload={}, status="parsing")
+            db.session.add(batch)
+            db.session.commit()
+
+            threading.Thread(
+                target=_parse_sales_import_job,
+                args=(current_app._get_current_object(), batch.id, path),
+                daemon=True,
+            ).start()
+        except Exception:
+            # The job owns (and removes) the file only once it has started
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise
+        return redirect(url_for("sales.import_preview", batch_id=batch.id), code=303)
+
+    # Decode while reading: neither the raw bytes nor the decoded text is held in full
+    result = _parse_sales_upload(io.TextIOWrapper(f.stream, encoding="utf-8-sig", newline=""))
+
+    if "error" in result:
+        flash(result["error"], "danger")
+        return redirect(url_for("sales.import_upload"))
+    if "payload" not in result:
+        return render_template(
+            "sales/import_upload.html",
+            expected_headers=SALES_IMPORT_HEADERS,
+            header_issues=result.get("header_issues"),
+            row_errors=result.get("row_errors"),
+        )
+
+    batch = ImportBatch(kind="sales_import", filename=f.filename, payload=result["payload"])
     db.session.add(batch)
     db.session.commit()
 
@@ -566,10 +793,141 @@ def import_preview(batch_id: int):
         flash("Import batch not found.", "danger")
         return redirect(url_for("sales.import_upload"))
 
+    if batch.status == "parsing" and datetime.utcnow() - batch.created_at > _PARSE_STALE_AFTER:
+        # The parsing worker died (restart/crash); stop polling and let the user re-upload
+        batch.payload = {"error": "Parsing this upload did not finish. Please upload the file again."}
+        batch.status = "failed"
+        db.session.commit()
+
     payload = batch.payload
+    if batch.status == "parsing":
+        return render_template("sales/import_parsing.html", batch=batch)
+    if batch.status == "failed":
+        if payload.get("error"):
+            flash(payload["error"], "danger")
+            return redirect(url_for("sales.import_upload"))
+        return render_template(
+            "sales/import_upload.html",
+            expected_headers=SALES_IMPORT_HEADERS,
+            header_issues=payload.get("header_issues"),
+            row_errors=payload.get("row_errors"),
+        )
     return render_template("sales/import_preview.html", batch=batch, payload=payload)
 
 
+def _upsert_sku_daily(line_rows):
+    """
+    Fold newly inserted sales line rows into sales_line_sku_daily:
+    summed per (sku, order_date, channel) in Python, then one upsert that adds
+    onto any existing totals for those keys.
+    """
+    agg = {}
+    for r in line_rows:
+        key = (r["sku"], r["order_date"], r["channel"])
+        a = agg.get(key)
+        if a is None:
+            a = agg[key] = {
+                "sku": r["sku"],
+                "order_date": r["order_date"],
+                "channel": r["channel"],
+                "description": None,
+                "qty": 0,
+                "revenue_net": _ZERO,
+                "cost_total": _ZERO,
+                "profit": _ZERO,
+                "line_discount_gross": _ZERO,
+                "order_discount_alloc_gross": _ZERO,
+            }
+        desc = r["description"] or None
+        if desc and (a["description"] is None or desc > a["description"]):
+            a["description"] = desc
+        a["qty"] += r["qty"]
+        # Same 4dp rounding the stored sales_lines values get
+        for col in ("revenue_net", "cost_total", "profit", "line_discount_gross", "order_discount_alloc_gross"):
+            a[col] += (r[col] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+
+    if not agg:
+        return
+
+    t = SalesLineSkuDaily.__table__
+    stmt = pg_insert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.sku, t.c.order_date, t.c.channel],
+        set_={
+            "description": db.func.coalesce(stmt.excluded.description, t.c.description),
+            "qty": t.c.qty + stmt.excluded.qty,
+            "revenue_net": t.c.revenue_net + stmt.excluded.revenue_net,
+            "cost_total": t.c.cost_total + stmt.excluded.cost_total,
+            "profit": t.c.profit + stmt.excluded.profit,
+            "line_discount_gross": t.c.line_discount_gross + stmt.excluded.line_discount_gross,
+            "order_discount_alloc_gross": t.c.order_discount_alloc_gross + stmt.excluded.order_discount_alloc_gross,
+            "updated_at": datetime.utcnow(),
+        },
+    )
+    db.session.execute(stmt, list(agg.values()))
+
+
+def _upsert_channel_daily(line_rows):
+    """
+    Fold newly inserted sales line rows into daily_channel_metrics, summed per
+    (order_date, channel) the same way the admin recompute builds them.
+    Imports only ever add whole new orders, so order counts add up too.
+    """
+    agg = {}
+    for r in line_rows:
+        key = (r["order_date"], r["channel"])
+        a = agg.get(key)
+        if a is None:
+            a = agg[key] = {
+                "metric_date": r["order_date"],
+                "channel": r["channel"],
+                "orders": set(),
+                "units": 0,
+                "revenue_net": _ZERO,
+                "cogs": _ZERO,
+                "profit": _ZERO,
+                "discount_gross": _ZERO,
+                "discount_net": _ZERO,
+            }
+        a["orders"].add(r["sales_order_id"])
+        a["units"] += r["qty"]
+        a["revenue_net"] += (r["revenue_net"] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+        a["cogs"] += (r["cost_total"] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+        a["profit"] += (r["profit"] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+        disc = (
+            (r["line_discount_gross"] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+            + (r["order_discount_alloc_gross"] or _ZERO).quantize(_Q4, rounding=ROUND_HALF_UP)
+        )
+        a["discount_gross"] += disc
+        if r["vat_rate"] is not None:
+            a["discount_net"] += disc / _vat_factor(r["vat_rate"])
+
+    if not agg:
+        return
+
+    rows = []
+    for a in agg.values():
+        a["orders_count"] = len(a.pop("orders"))
+        a["discount_net"] = a["discount_net"].quantize(_Q4, rounding=ROUND_HALF_UP)
+        rows.append(a)
+
+    t = DailyChannelMetric.__table__
+    stmt = pg_insert(t)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.metric_date, t.c.channel],
+        set_={
+            "orders_count": t.c.orders_count + stmt.excluded.orders_count,
+            "units": t.c.units + stmt.excluded.units,
+            "revenue_net": t.c.revenue_net + stmt.excluded.revenue_net,
+            "cogs": t.c.cogs + stmt.excluded.cogs,
+            "profit": t.c.profit + stmt.excluded.profit,
+            "discount_gross": t.c.discount_gross + stmt.excluded.discount_gross,
+            "discount_net": t.c.discount_net + stmt.excluded.discount_net,
+        },
+    )
+    db.session.execute(stmt, rows)
+
+
 @sales_bp.post("/import/<int:batch_id>/commit")
 @login_required
 @require_edit_permission
@@ -579,6 +937,10 @@ def import_commit(batch_id: int):
         flash("Import batch not found.", "danger")
         return redirect(url_for("sales.import_upload"))
 
+    if batch.status != "ready":
+        flash("This import is not ready to commit.", "danger")
+        return redirect(url_for("sales.import_preview", batch_id=batch.id))
+
     payload = batch.payload
 
     create_missing = (request.form.get("create_missing") == "1")
@@ -590,6 +952,37 @@ def import_commit(batch_id: int):
     skipped_existing = 0
     skipped_missing_sku = 0
 
+    # One purchase-lines query for the whole batch instead of one per sales line
+    all_skus = {
+        (ln.get("sku") or "").strip()
+        for o in payload.get("orders", [])
+        for ln in o.get("lines", [])
+    }
+    cost_index = _build_cost_index(all_skus)
+
+    all_skus.discard("")
+    items_by_sku = {}
+    if all_skus:
+        items_by_sku = {it.sku: it for it in Item.query.filter(Item.sku.in_(all_skus)).all()}
+
+    order_numbers = {
+        (o.get("order_number") or "").strip()
+        for o in payload.get("orders", [])
+    }
+    order_numbers.discard("")
+    existing_orders = set()
+    if order_numbers:
+        existing_orders = {
+            (ch, num)
+            for ch, num in db.session.query(SalesOrder.channel, SalesOrder.order_number)
+            .filter(SalesOrder.order_number.in_(order_numbers))
+            .all()
+        }
+
+    # Rows are fully computed in Python, then written with two bulk INSERTs
+    orders_to_insert = []
+    lines_to_insert = []
+
     for o in payload.get("orders", []):
         order_number = (o.get("order_number") or "").strip()
         if not order_number:
@@ -599,27 +992,26 @@ def import_commit(batch_id: int):
         currency = (o.get("currency") or "EUR").strip().upper()
         order_date = _safe_date(o.get("order_date") or "") or datetime.utcnow().date()
 
-        existing = SalesOrder.query.filter_by(channel=channel, order_number=order_number).first()
-        if existing:
+        if (channel, order_number) in existing_orders:
             skipped_existing += 1
             continue
-
-        shipping_gross = _safe_decimal(o.get("shipping_charged_gross"), default=Decimal("0"))
-        order_disc_gross = _safe_decimal(o.get("order_discount_gross"), default=Decimal("0"))
-
-        so = SalesOrder(
-            order_number=order_number,
-            order_date=order_date,
-            channel=channel,
-            currency=currency,
-            customer_name=o.get("customer_name"),
-            customer_email=o.get("customer_email"),
-            shipping_charged_gross=shipping_gross if shipping_gross != 0 else None,
-            order_discount_gross=order_disc_gross if order_disc_gross != 0 else None,
-        )
-        db.session.add(so)
-        db.session.flush()
-        created_orders += 1
+        existing_orders.add((channel, order_number))
+
+        shipping_gross = _safe_decimal(o.get("shipping_charged_gross"))
+        order_disc_gross = _safe_decimal(o.get("order_discount_gross"))
+
+        order_row = {
+            "order_number": order_number,
+            "order_date": order_date,
+            "channel": channel,
+            "currency": currency,
+            "customer_name": o.get("customer_name"),
+            "customer_email": o.get("customer_email"),
+            "shipping_charged_gross": shipping_gross if shipping_gross != 0 else None,
+            "order_discount_gross": order_disc_gross if order_disc_gross != 0 else None,
+        }
+        orders_to_insert.append(order_row)
+        order_key = (channel, order_number)
 
         prepared = []
         for ln in o.get("lines", []):
@@ -627,7 +1019,7 @@ def import_commit(batch_id: int):
             if not sku:
                 continue
 
-            item = Item.query.filter_by(sku=sku).first()
+            item = items_by_sku.get(sku)
             if not item and create_missing:
                 item = Item(
                     sku=sku,
@@ -637,6 +1029,7 @@ def import_commit(batch_id: int):
                 )
                 db.session.add(item)
                 db.session.flush()
+                items_by_sku[sku] = item
                 created_items += 1
 
             if not item:
@@ -647,8 +1040,8 @@ def import_commit(batch_id: int):
             if qty <= 0:
                 continue
 
-            unit_price_gross = _safe_decimal(ln.get("unit_price_gross"), default=Decimal("0"))
-            line_discount_gross = _safe_decimal(ln.get("line_discount_gross"), default=Decimal("0"))
+            unit_price_gross = _safe_decimal(ln.get("unit_price_gross"))
+            line_discount_gross = _safe_decimal(ln.get("line_discount_gross"))
 
             gross_line = unit_price_gross * Decimal(qty)
             base_after_line_discount = gross_line - line_discount_gross
@@ -670,6 +1063,10 @@ def import_commit(batch_id: int):
         total_base = sum(p["base_after_line_discount"] for p in prepared) or Decimal("0")
         order_discount_total = order_disc_gross if order_disc_gross is not None else Decimal("0")
 
+        # Order totals, rounded per line like the stored NUMERIC(12,4) line values
+        order_rev = order_cost = order_profit = _ZERO
+        order_units = 0
+
         for p in prepared:
             alloc = Decimal("0")
             if order_discount_total > 0 and total_base > 0:
@@ -679,37 +1076,81 @@ def import_commit(batch_id: int):
             if gross_after_all_discounts < 0:
                 gross_after_all_discounts = Decimal("0")
 
-            vat_rate = Decimal(str(p["item"].vat_rate or Decimal("18.00")))
+            vat_rate = Decimal(p["item"].vat_rate or Decimal("18.00"))
 
-            unit_price_net = _gross_to_net(p["unit_price_gross"], vat_rate)
-            revenue_net = _gross_to_net(gross_after_all_discounts, vat_rate)
+            # One cached factor lookup per line; both nets are a single division
+            factor = _vat_factor(vat_rate)
+            if factor > 0:
+                unit_price_net = p["unit_price_gross"] / factor
+                revenue_net = gross_after_all_discounts / factor
+            else:
+                unit_price_net = p["unit_price_gross"]
+                revenue_net = gross_after_all_discounts
 
-            unit_cost_basis, cost_source_po_id = _compute_unit_cost_basis(p["sku"], order_date, cost_method)
+            unit_cost_basis, cost_source_po_id = _compute_from_index(cost_index, p["sku"], order_date, cost_method)
             cost_total = unit_cost_basis * Decimal(p["qty"])
             profit = revenue_net - cost_total
 
-            sl = SalesLine(
-                sales_order_id=so.id,
-                item_id=p["item"].id,
-                sku=p["sku"],
-                description=(p["description"] or "")[:255],
-                qty=p["qty"],
-                unit_price_gross=p["unit_price_gross"],
-                line_discount_gross=p["line_discount_gross"] if p["line_discount_gross"] != 0 else None,
-                order_discount_alloc_gross=alloc if alloc != 0 else None,
-                vat_rate=vat_rate,
-                unit_price_net=unit_price_net,
-                revenue_net=revenue_net,
-                cost_method=cost_method,
-                unit_cost_basis=unit_cost_basis,
-                cost_total=cost_total,
-                profit=profit,
-                cost_source_po_id=cost_source_po_id,
+            order_rev += revenue_net.quantize(_Q4, rounding=ROUND_HALF_UP)
+            order_cost += cost_total.quantize(_Q4, rounding=ROUND_HALF_UP)
+            order_profit += profit.quantize(_Q4, rounding=ROUND_HALF_UP)
+            order_units += p["qty"]
+
+            lines_to_insert.append(
+                (
+                    order_key,
+                    {
+                        "item_id": p["item"].id,
+                        "sku": p["sku"],
+                        "description": (p["description"] or "")[:255],
+                        "qty": p["qty"],
+                        "unit_price_gross": p["unit_price_gross"],
+                        "line_discount_gross": p["line_discount_gross"] if p["line_discount_gross"] != 0 else None,
+                        "order_discount_alloc_gross": alloc if alloc != 0 else None,
+                        "vat_rate": vat_rate,
+                        "unit_price_net": unit_price_net,
+                        "revenue_net": revenue_net,
+                        "cost_method": cost_method,
+                        "unit_cost_basis": unit_cost_basis,
+                        "cost_total": cost_total,
+                        "profit": profit,
+                        "cost_source_po_id": cost_source_po_id,
+                        "order_date": order_date,
+                        "channel": channel,
+                    },
+                )
             )
-            db.session.add(sl)
-            created_lines += 1
+
+        order_row["total_revenue_net"] = order_rev
+        order_row["total_cost"] = order_cost
+        order_row["total_profit"] = order_profit
+        order_row["total_units"] = order_units
+
+    if orders_to_insert:
+        inserted = db.session.execute(
+            db.insert(SalesOrder).returning(SalesOrder.id, SalesOrder.channel, SalesOrder.order_number),
+            orders_to_insert,
+        ).all()
+        order_ids = {(ch, num): oid for oid, ch, num in inserted}
+        created_orders = len(inserted)
+
+        if lines_to_insert:
+            rows = []
+            for order_key, row in lines_to_insert:
+                row["sales_order_id"] = order_ids[order_key]
+                rows.append(row)
+            first_lines = db.session.query(SalesLine.id).limit(1).first() is None
+            db.session.execute(db.insert(SalesLine), rows)
+            created_lines = len(rows)
+            _upsert_sku_daily(rows)
+            _upsert_channel_daily(rows)
+            if first_lines:
+                # Nothing older to backfill: the rollups now cover every line
+                mark_rollups_ready(SKU_DAILY_READY_KEY, CHANNEL_DAILY_READY_KEY)
 
     db.session.commit()
+    if created_orders:
+        invalidate_channels({o["channel"] for o in orders_to_insert})
 
     flash(
         f"Sales import complete. Created orders: {created_orders}, lines: {created_lines}, "
@@ -748,8 +1189,8 @@ def items_report():
     if q:
         query = query.filter(
             db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
+                text_match(SalesLine.sku, q),
+                text_match(SalesLine.description, q),
             )
         )
 
@@ -768,18 +1209,12 @@ def items_report():
         .all()
     )
 
-    channels = [
-        r[0]
-        for r in db.session.query(SalesOrder.channel)
-        .distinct()
-        .order_by(SalesOrder.channel.asc())
-        .all()
-    ]
+    channels = sales_channels()
 
     total_qty = sum(int(r.qty_sold or 0) for r in rows)
-    total_rev = sum(Decimal(str(r.revenue_net or 0)) for r in rows)
-    total_cost = sum(Decimal(str(r.cost_total or 0)) for r in rows)
-    total_profit = sum(Decimal(str(r.profit or 0)) for r in rows)
+    total_rev = sum(_d(r.revenue_net) for r in rows)
+    total_cost = sum(_d(r.cost_total) for r in rows)
+    total_profit = sum(_d(r.profit) for r in rows)
     total_margin = Decimal("0")
     if total_rev > 0:
         total_margin = (total_profit / total_rev) * Decimal("100")
@@ -817,6 +1252,16 @@ def items_report_csv():
             db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("revenue_net"),
             db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost_total"),
             db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
+            db.func.coalesce(
+                db.case(
+                    (
+                        db.func.sum(SalesLine.revenue_net) > 0,
+                        db.func.sum(SalesLine.profit) * 100
+                        / db.type_coerce(db.func.sum(SalesLine.revenue_net), db.Numeric),
+                    )
+                ),
+                0,
+            ).label("margin"),
         )
         .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
     )
@@ -824,8 +1269,8 @@ def items_report_csv():
     if q:
         query = query.filter(
             db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
+                text_match(SalesLine.sku, q),
+                text_match(SalesLine.description, q),
             )
         )
     if channel:
@@ -843,20 +1288,16 @@ def items_report_csv():
 
     headers = ["SKU", "Description", "Qty Sold", "Revenue Net", "Cost Total", "Profit", "Margin %"]
 
+    # Sums and margin come back computed; rows only need formatting
     def row_fn(r):
-        rev = Decimal(str(r.revenue_net or 0))
-        prof = Decimal(str(r.profit or 0))
-        margin = Decimal("0")
-        if rev > 0:
-            margin = (prof / rev) * Decimal("100")
         return [
             r.sku,
             r.description or "",
             int(r.qty_sold or 0),
-            f"{rev:.2f}",
-            f"{Decimal(str(r.cost_total or 0)):.2f}",
-            f"{prof:.2f}",
-            f"{margin:.2f}",
+            format(r.revenue_net, ".2f"),
+            format(r.cost_total, ".2f"),
+            format(r.profit, ".2f"),
+            format(r.margin, ".2f"),
         ]
 
     return stream_csv(rows, headers, row_fn, filename="sales_items_report.csv")
@@ -875,62 +1316,20 @@ def discount_report():
     date_from = _safe_date(request.args.get("from") or "")
     date_to = _safe_date(request.args.get("to") or "")
 
-    query = (
-        db.session.query(
-            SalesLine.sku.label("sku"),
-            db.func.max(SalesLine.description).label("description"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("qty_sold"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("revenue_net"),
-            db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost_total"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-            db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0).label("line_discount_gross"),
-            db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0).label("order_discount_alloc_gross"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-    )
-
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
-            )
-        )
-    if channel:
-        query = query.filter(db.func.lower(SalesOrder.channel) == channel)
-    if date_from:
-        query = query.filter(SalesOrder.order_date >= date_from)
-    if date_to:
-        query = query.filter(SalesOrder.order_date <= date_to)
-
-    rows = (
-        query.group_by(SalesLine.sku)
-        .order_by(
-            db.desc(
-                db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0)
-                + db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0)
-            )
-        )
-        .limit(500)
-        .all()
-    )
+    stmt = sku_aggregate_select(q, channel, date_from, date_to)
+    rows = db.session.execute(stmt.order_by(db.desc("discount_gross")).limit(500)).all()
 
-    channels = [
-        r[0]
-        for r in db.session.query(SalesOrder.channel)
-        .distinct()
-        .order_by(SalesOrder.channel.asc())
-        .all()
-    ]
+    channels = sales_channels()
 
-    total_qty = sum(int(r.qty_sold or 0) for r in rows)
-    total_rev = sum(Decimal(str(r.revenue_net or 0)) for r in rows)
-    total_cost = sum(Decimal(str(r.cost_total or 0)) for r in rows)
-    total_profit = sum(Decimal(str(r.profit or 0)) for r in rows)
-    total_disc_gross = sum(
-        Decimal(str(r.line_discount_gross or 0)) + Decimal(str(r.order_discount_alloc_gross or 0))
-        for r in rows
-    )
+    # Totals over the rows shown (top 500), in one pass
+    total_qty = 0
+    total_rev = total_cost = total_profit = total_disc_gross = _ZERO
+    for r in rows:
+        total_qty += int(r.qty_sold or 0)
+        total_rev += _d(r.revenue_net)
+        total_cost += _d(r.cost_total)
+        total_profit += _d(r.profit)
+        total_disc_gross += _d(r.discount_gross)
 
     total_margin = Decimal("0")
     if total_rev > 0:
@@ -969,50 +1368,15 @@ def discount_report_csv():
     date_from = _safe_date(request.args.get("from") or "")
     date_to = _safe_date(request.args.get("to") or "")
 
-    query = (
-        db.session.query(
-            SalesLine.sku.label("sku"),
-            db.func.max(SalesLine.description).label("description"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("qty_sold"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("revenue_net"),
-            db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost_total"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-            db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0).label("line_discount_gross"),
-            db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0).label("order_discount_alloc_gross"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-    )
-
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
-            )
-        )
-    if channel:
-        query = query.filter(db.func.lower(SalesOrder.channel) == channel)
-    if date_from:
-        query = query.filter(SalesOrder.order_date >= date_from)
-    if date_to:
-        query = query.filter(SalesOrder.order_date <= date_to)
-
-    rows = (
-        query.group_by(SalesLine.sku)
-        .order_by(
-            db.desc(
-                db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0)
-                + db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0)
-            )
-        )
-        .yield_per(500)
-    )
+    stmt = sku_aggregate_select(q, channel, date_from, date_to).order_by(db.desc("discount_gross"))
+    # Core execution: plain rows off a server-side cursor, no ORM Query layer
+    rows = db.session.execute(stmt.execution_options(stream_results=True, yield_per=1000))
 
     headers = ["SKU", "Description", "Qty Sold", "Revenue Net", "Cost Total", "Profit", "Discount Gross", "Discount % (approx)"]
 
     def row_fn(r):
-        disc_gross = Decimal(str(r.line_discount_gross or 0)) + Decimal(str(r.order_discount_alloc_gross or 0))
-        rev_net = Decimal(str(r.revenue_net or 0))
+        disc_gross = _d(r.discount_gross)
+        rev_net = _d(r.revenue_net)
         approx_gross = rev_net * Decimal("1.18")
         disc_pct = Decimal("0")
         if approx_gross > 0:
@@ -1023,13 +1387,13 @@ def discount_report_csv():
             r.description or "",
             int(r.qty_sold or 0),
             f"{rev_net:.2f}",
-            f"{Decimal(str(r.cost_total or 0)):.2f}",
-            f"{Decimal(str(r.profit or 0)):.2f}",
+            f"{_d(r.cost_total):.2f}",
+            f"{_d(r.profit):.2f}",
             f"{disc_gross:.2f}",
             f"{disc_pct:.2f}",
         ]
 
-    return stream_csv(rows, headers, row_fn, filename="sales_discount_report.csv")
+    return stream_csv_fast(rows, headers, row_fn, filename="sales_discount_report.csv")
 
 
 # -------------------------
@@ -1048,61 +1412,25 @@ def alerts():
     margin_threshold = _safe_decimal(request.args.get("margin") or "20", default=Decimal("20"))
     discount_threshold = _safe_decimal(request.args.get("discount") or "15", default=Decimal("15"))
 
-    query = (
-        db.session.query(
-            SalesLine.sku.label("sku"),
-            db.func.max(SalesLine.description).label("description"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("qty_sold"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("revenue_net"),
-            db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost_total"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-            db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0).label("line_discount_gross"),
-            db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0).label("order_discount_alloc_gross"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-    )
-
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
-            )
+    # Negative profit first, then lowest margin, highest discount, highest profit
+    rows = db.session.execute(
+        _sku_alerts_query(q, channel, date_from, date_to, margin_threshold, discount_threshold)
+        .order_by(
+            db.desc("flag_negative"),
+            db.asc("margin_pct"),
+            db.desc("discount_pct"),
+            db.desc("profit"),
+            db.asc("sku"),
         )
-
-    if channel:
-        query = query.filter(db.func.lower(SalesOrder.channel) == channel)
-
-    if date_from:
-        query = query.filter(SalesOrder.order_date >= date_from)
-    if date_to:
-        query = query.filter(SalesOrder.order_date <= date_to)
-
-    rows = query.group_by(SalesLine.sku).all()
+    ).all()
 
     alert_rows = []
     counts = {"negative_profit": 0, "low_margin": 0, "high_discount": 0}
 
     for r in rows:
-        rev_net = Decimal(str(r.revenue_net or 0))
-        profit = Decimal(str(r.profit or 0))
-        cost_total = Decimal(str(r.cost_total or 0))
-        qty_sold = int(r.qty_sold or 0)
-
-        disc_gross = Decimal(str(r.line_discount_gross or 0)) + Decimal(str(r.order_discount_alloc_gross or 0))
-
-        margin_pct = Decimal("0")
-        if rev_net > 0:
-            margin_pct = (profit / rev_net) * Decimal("100")
-
-        approx_gross_sales = rev_net * Decimal("1.18")
-        discount_pct = Decimal("0")
-        if approx_gross_sales > 0:
-            discount_pct = (disc_gross / approx_gross_sales) * Decimal("100")
-
-        is_negative = profit < 0
-        is_low_margin = (rev_net > 0) and (margin_pct < margin_threshold)
-        is_high_discount = (disc_gross > 0) and (discount_pct > discount_threshold)
+        is_negative = bool(r.flag_negative)
+        is_low_margin = bool(r.flag_low_margin)
+        is_high_discount = bool(r.flag_high_discount)
 
         if is_negative:
             counts["negative_profit"] += 1
@@ -1111,41 +1439,24 @@ def alerts():
         if is_high_discount:
             counts["high_discount"] += 1
 
-        if is_negative or is_low_margin or is_high_discount:
-            alert_rows.append(
-                {
-                    "sku": r.sku,
-                    "description": r.description or "",
-                    "qty_sold": qty_sold,
-                    "revenue_net": rev_net,
-                    "cost_total": cost_total,
-                    "profit": profit,
-                    "margin_pct": margin_pct,
-                    "discount_gross": disc_gross,
-                    "discount_pct": discount_pct,
-                    "flag_negative": is_negative,
-                    "flag_low_margin": is_low_margin,
-                    "flag_high_discount": is_high_discount,
-                }
-            )
-
-    def _sort_key(x):
-        return (
-            0 if x["flag_negative"] else 1,
-            float(x["margin_pct"]),
-            -float(x["discount_pct"]),
-            -float(x["profit"]),
+        alert_rows.append(
+            {
+                "sku": r.sku,
+                "description": r.description or "",
+                "qty_sold": int(r.qty_sold or 0),
+                "revenue_net": _d(r.revenue_net),
+                "cost_total": _d(r.cost_total),
+                "profit": _d(r.profit),
+                "margin_pct": _d(r.margin_pct),
+                "discount_gross": _d(r.discount_gross),
+                "discount_pct": _d(r.discount_pct),
+                "flag_negative": is_negative,
+                "flag_low_margin": is_low_margin,
+                "flag_high_discount": is_high_discount,
+            }
         )
 
-    alert_rows.sort(key=_sort_key)
-
-    channels = [
-        r[0]
-        for r in db.session.query(SalesOrder.channel)
-        .distinct()
-        .order_by(SalesOrder.channel.asc())
-        .all()
-    ]
+    channels = sales_channels()
 
     return render_template(
         "sales/alerts.html",
@@ -1173,35 +1484,8 @@ def alerts_csv():
     margin_threshold = _safe_decimal(request.args.get("margin") or "20", default=Decimal("20"))
     discount_threshold = _safe_decimal(request.args.get("discount") or "15", default=Decimal("15"))
 
-    query = (
-        db.session.query(
-            SalesLine.sku.label("sku"),
-            db.func.max(SalesLine.description).label("description"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("qty_sold"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("revenue_net"),
-            db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost_total"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-            db.func.coalesce(db.func.sum(SalesLine.line_discount_gross), 0).label("line_discount_gross"),
-            db.func.coalesce(db.func.sum(SalesLine.order_discount_alloc_gross), 0).label("order_discount_alloc_gross"),
-        )
-        .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-    )
-
-    if q:
-        query = query.filter(
-            db.or_(
-                db.func.lower(SalesLine.sku).contains(q),
-                db.func.lower(SalesLine.description).contains(q),
-            )
-        )
-    if channel:
-        query = query.filter(db.func.lower(SalesOrder.channel) == channel)
-    if date_from:
-        query = query.filter(SalesOrder.order_date >= date_from)
-    if date_to:
-        query = query.filter(SalesOrder.order_date <= date_to)
-
-    rows = query.group_by(SalesLine.sku).yield_per(500)
+    stmt = _sku_alerts_query(q, channel, date_from, date_to, margin_threshold, discount_threshold)
+    rows = db.session.execute(stmt.execution_options(stream_results=True, yield_per=1000))
 
     headers = [
         "SKU", "Description", "Qty Sold", "Revenue Net", "Cost Total", "Profit", "Margin %",
@@ -1209,58 +1493,22 @@ def alerts_csv():
     ]
 
     def row_fn(r):
-        rev_net = Decimal(str(r.revenue_net or 0))
-        profit = Decimal(str(r.profit or 0))
-        cost_total = Decimal(str(r.cost_total or 0))
-        qty_sold = int(r.qty_sold or 0)
-
-        disc_gross = Decimal(str(r.line_discount_gross or 0)) + Decimal(str(r.order_discount_alloc_gross or 0))
-
-        margin_pct = Decimal("0")
-        if rev_net > 0:
-            margin_pct = (profit / rev_net) * Decimal("100")
-
-        approx_gross_sales = rev_net * Decimal("1.18")
-        discount_pct = Decimal("0")
-        if approx_gross_sales > 0:
-            discount_pct = (disc_gross / approx_gross_sales) * Decimal("100")
-
-        flag_negative = profit < 0
-        flag_low_margin = (rev_net > 0) and (margin_pct < margin_threshold)
-        flag_high_discount = (disc_gross > 0) and (discount_pct > discount_threshold)
-
-        if not (flag_negative or flag_low_margin or flag_high_discount):
-            # Skip non-alert rows in CSV too
-            return None
-
         return [
             r.sku,
             r.description or "",
-            qty_sold,
-            f"{rev_net:.2f}",
-            f"{cost_total:.2f}",
-            f"{profit:.2f}",
-            f"{margin_pct:.2f}",
-            f"{disc_gross:.2f}",
-            f"{discount_pct:.2f}",
-            "YES" if flag_negative else "",
-            "YES" if flag_low_margin else "",
-            "YES" if flag_high_discount else "",
+            int(r.qty_sold or 0),
+            f"{_d(r.revenue_net):.2f}",
+            f"{_d(r.cost_total):.2f}",
+            f"{_d(r.profit):.2f}",
+            f"{_d(r.margin_pct):.2f}",
+            f"{_d(r.discount_gross):.2f}",
+            f"{_d(r.discount_pct):.2f}",
+            "YES" if r.flag_negative else "",
+            "YES" if r.flag_low_margin else "",
+            "YES" if r.flag_high_discount else "",
         ]
 
-    # stream_csv expects every row_fn to return a list; so we wrap an iterator that skips None
-    def filtered_rows():
-        for rr in rows:
-            out = row_fn(rr)
-            if out is not None:
-                yield out
-
-    return stream_csv(
-        filtered_rows(),
-        headers=headers,
-        row_fn=lambda x: x,  # already formatted
-        filename="sales_alerts.csv",
-    )
+    return stream_csv_fast(rows, headers=headers, row_fn=row_fn, filename="sales_alerts.csv")
 
 
 # -------------------------
@@ -1276,61 +1524,60 @@ def export_orders_csv():
     date_from = _safe_date(request.args.get("from") or "")
     date_to = _safe_date(request.args.get("to") or "")
 
-    base = SalesOrder.query
+    filters = []
     if q:
-        base = base.filter(
+        filters.append(
             db.or_(
-                db.func.lower(SalesOrder.order_number).contains(q),
-                db.func.lower(SalesOrder.customer_name).contains(q),
-                db.func.lower(SalesOrder.customer_email).contains(q),
+                text_match(SalesOrder.order_number, q),
+                text_match(SalesOrder.customer_name, q),
+                text_match(SalesOrder.customer_email, q),
             )
         )
     if channel:
-        base = base.filter(db.func.lower(SalesOrder.channel) == channel)
+        filters.append(db.func.lower(SalesOrder.channel) == channel)
     if date_from:
-        base = base.filter(SalesOrder.order_date >= date_from)
+        filters.append(SalesOrder.order_date >= date_from)
     if date_to:
-        base = base.filter(SalesOrder.order_date <= date_to)
-
-    totals_sq = (
-        db.session.query(
-            SalesLine.sales_order_id.label("oid"),
-            db.func.coalesce(db.func.sum(SalesLine.revenue_net), 0).label("rev"),
-            db.func.coalesce(db.func.sum(SalesLine.cost_total), 0).label("cost"),
-            db.func.coalesce(db.func.sum(SalesLine.profit), 0).label("profit"),
-            db.func.coalesce(db.func.sum(SalesLine.qty), 0).label("units"),
+        filters.append(SalesOrder.order_date <= date_to)
+
+    # Per-order totals are stored on sales_orders at import: a plain ordered scan,
+    # no sales_lines group-by. Core select of just the exported columns, streamed
+    # off a server-side cursor.
+    stmt = (
+        db.select(
+            SalesOrder.order_date,
+            SalesOrder.order_number,
+            SalesOrder.channel,
+            SalesOrder.currency,
+            SalesOrder.total_revenue_net.label("rev"),
+            SalesOrder.total_cost.label("cost"),
+            SalesOrder.total_profit.label("profit"),
+            SalesOrder.total_units.label("units"),
         )
-        .group_by(SalesLine.sales_order_id)
-        .subquery()
-    )
-
-    rows = (
-        base.outerjoin(totals_sq, totals_sq.c.oid == SalesOrder.id)
-        .add_columns(totals_sq.c.rev, totals_sq.c.cost, totals_sq.c.profit, totals_sq.c.units)
+        .where(*filters)
         .order_by(SalesOrder.order_date.desc(), SalesOrder.id.desc())
-        .yield_per(500)
     )
+    rows = db.session.execute(stmt.execution_options(stream_results=True, yield_per=1000))
 
     headers = ["Order Date", "Order Number", "Channel", "Currency", "Units", "Revenue Net", "Cost", "Profit", "Margin %"]
 
-    def row_fn(row):
-        so, rev, cost, prof, units = row
-        rev_d = Decimal(str(rev or 0))
-        prof_d = Decimal(str(prof or 0))
+    def row_fn(r):
+        rev_d = _d(r.rev)
+        prof_d = _d(r.profit)
         margin = Decimal("0")
         if rev_d > 0:
             margin = (prof_d / rev_d) * Decimal("100")
 
         return [
-            so.order_date.isoformat() if so.order_date else "",
-            so.order_number or "",
-            so.channel or "",
-            so.currency or "",
-            int(units or 0),
+            r.order_date.isoformat() if r.order_date else "",
+            r.order_number or "",
+            r.channel or "",
+            r.currency or "",
+            int(r.units or 0),
             f"{rev_d:.2f}",
-            f"{Decimal(str(cost or 0)):.2f}",
+            f"{_d(r.cost):.2f}",
             f"{prof_d:.2f}",
             f"{margin:.2f}",
         ]
 
-    return stream_csv(rows, headers, row_fn, filename="sales_orders_export.csv")
+    return stream_csv_fast(rows, headers, row_fn, filename="sales_orders_export.csv")
@@ -2,6 +2,7 @@ from urllib.parse import urlencode
 
 from flask import Blueprint, request, redirect, url_for, flash
 from flask_login import login_required, current_user
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from ..extensions import db
 from ..decorators import require_edit_permission, require_role
@@ -44,20 +45,18 @@ def save():
     qs = urlencode(params)
     full_url = f"{base_url}?{qs}" if qs else base_url
 
-    existing = SavedSearch.query.filter_by(
-        user_id=current_user.id, context=context, name=name
-    ).first()
-
-    if existing:
-        existing.url = full_url
-    else:
-        db.session.add(SavedSearch(
-            user_id=current_user.id,
-            context=context,
-            name=name,
-            url=full_url,
-        ))
-
+    # Single upsert on uq_saved_search_user_context_name (same name overwrites the URL)
+    stmt = pg_insert(SavedSearch).values(
+        user_id=current_user.id,
+        context=context,
+        name=name,
+        url=full_url,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["user_id", "context", "name"],
+        set_={"url": stmt.excluded.url},
+    )
+    db.session.execute(stmt)
     db.session.commit()
     flash("Saved search stored.", "success")
     return redirect(request.referrer or url_for(_CONTEXT_ENDPOINT[context]))
@@ -1,16 +1,18 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Blueprint, render_template, request, url_for, jsonify
+from flask import Blueprint, copy_current_request_context, render_template, request, url_for, jsonify
 from flask_login import login_required, current_user
 
 from ..decorators import require_role
 from ..extensions import db
 from ..models import Item, PurchaseOrder, PurchaseLine, SalesOrder, SalesLine
-
-import hashlib
 from ..utils.cache import TTLCache
+from ..utils.text_match import text_match
 
 search_bp = Blueprint("search", __name__, url_prefix="")
 _search_cache = TTLCache(ttl_seconds=30, max_items=600)
+# Runs the sub-searches of one global search concurrently
+_search_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix="global-search")
 
 def _q(s: str) -> str:
     return (s or "").strip()
@@ -38,18 +40,17 @@ def _so_url(order_id: int) -> str:
 
 def _search_catalog(q: str, limit: int = 8):
     ql = q.lower()
-    rows = (
-        Item.query
-        .filter(
+    rows = db.session.execute(
+        db.select(Item.sku, Item.description)
+        .where(
             db.or_(
-                db.func.lower(Item.sku).contains(ql),
-                db.func.lower(Item.description).contains(ql),
+                text_match(Item.sku, ql),
+                text_match(Item.description, ql),
             )
         )
         .order_by(Item.sku.asc())
         .limit(limit)
-        .all()
-    )
+    ).all()
     out = []
     for it in rows:
         out.append({
@@ -60,102 +61,136 @@ def _search_catalog(q: str, limit: int = 8):
     return out
 
 
-def _search_purchase_orders(q: str, limit: int = 8):
+def _search_purchases(q: str, limit: int = 8):
+    """
+    Matching POs, then PO lines by SKU (helpful when user types a SKU and wants
+    to find which PO it came in on): up to `limit` of each, in one UNION ALL.
+    """
     ql = q.lower()
-    rows = (
-        PurchaseOrder.query
-        .filter(
+    orders = (
+        db.select(
+            db.literal(0).label("kind"),
+            PurchaseOrder.id,
+            PurchaseOrder.order_number,
+            PurchaseOrder.supplier_name,
+            PurchaseOrder.brand,
+            db.cast(db.null(), db.String).label("sku"),
+            db.cast(db.null(), db.Integer).label("qty"),
+            PurchaseOrder.created_at,
+        )
+        .where(
             db.or_(
-                db.func.lower(PurchaseOrder.order_number).contains(ql),
-                db.func.lower(PurchaseOrder.supplier_name).contains(ql),
-                db.func.lower(PurchaseOrder.brand).contains(ql),
+                text_match(PurchaseOrder.order_number, ql),
+                text_match(PurchaseOrder.supplier_name, ql),
+                text_match(PurchaseOrder.brand, ql),
             )
         )
         .order_by(PurchaseOrder.created_at.desc())
         .limit(limit)
-        .all()
+        .subquery()
     )
-    out = []
-    for po in rows:
-        supplier = po.supplier_name or "Supplier"
-        brand = po.brand or ""
-        meta = f"{supplier}" + (f" • {brand}" if brand else "")
-        out.append({
-            "title": f"PO {po.order_number}",
-            "subtitle": meta,
-            "url": _po_url(po.id),
-        })
-    return out
-
-
-def _search_purchase_lines(q: str, limit: int = 8):
-    # Helpful when user types a SKU and wants to find which PO it came in on
-    ql = q.lower()
-    rows = (
-        db.session.query(PurchaseLine, PurchaseOrder)
+    lines = (
+        db.select(
+            db.literal(1).label("kind"),
+            PurchaseOrder.id,
+            PurchaseOrder.order_number,
+            PurchaseOrder.supplier_name,
+            db.cast(db.null(), db.String).label("brand"),
+            PurchaseLine.sku,
+            PurchaseLine.qty,
+            PurchaseOrder.created_at,
+        )
         .join(PurchaseOrder, PurchaseLine.purchase_order_id == PurchaseOrder.id)
-        .filter(db.func.lower(PurchaseLine.sku).contains(ql))
+        .where(text_match(PurchaseLine.sku, ql))
         .order_by(PurchaseOrder.created_at.desc())
         .limit(limit)
-        .all()
+        .subquery()
     )
+    rows = db.session.execute(
+        db.union_all(db.select(orders), db.select(lines)).order_by("kind", db.desc("created_at"))
+    ).all()
+
     out = []
-    for pl, po in rows:
-        supplier = po.supplier_name or "Supplier"
-        out.append({
-            "title": f"{pl.sku} in PO {po.order_number}",
-            "subtitle": f"{supplier} • qty {pl.qty or 0}",
-            "url": _po_url(po.id),
-        })
+    for r in rows:
+        supplier = r.supplier_name or "Supplier"
+        if r.kind == 0:
+            brand = r.brand or ""
+            out.append({
+                "title": f"PO {r.order_number}",
+                "subtitle": f"{supplier}" + (f" • {brand}" if brand else ""),
+                "url": _po_url(r.id),
+            })
+        else:
+            out.append({
+                "title": f"{r.sku} in PO {r.order_number}",
+                "subtitle": f"{supplier} • qty {r.qty or 0}",
+                "url": _po_url(r.id),
+            })
     return out
 
 
-def _search_sales_orders(q: str, limit: int = 8):
+def _search_sales(q: str, limit: int = 8):
+    """
+    Matching sales orders, then order lines by SKU (helpful when user searches a
+    SKU and wants orders containing it): up to `limit` of each, in one UNION ALL.
+    """
     ql = q.lower()
-    rows = (
-        SalesOrder.query
-        .filter(
+    orders = (
+        db.select(
+            db.literal(0).label("kind"),
+            SalesOrder.id,
+            SalesOrder.order_number,
+            SalesOrder.channel,
+            SalesOrder.order_date,
+            db.cast(db.null(), db.String).label("sku"),
+            db.cast(db.null(), db.Integer).label("qty"),
+        )
+        .where(
             db.or_(
-                db.func.lower(SalesOrder.order_number).contains(ql),
-                db.func.lower(SalesOrder.channel).contains(ql),
-                db.func.lower(SalesOrder.customer_name).contains(ql),
-                db.func.lower(SalesOrder.customer_email).contains(ql),
+                text_match(SalesOrder.order_number, ql),
+                text_match(SalesOrder.channel, ql),
+                text_match(SalesOrder.customer_name, ql),
+                text_match(SalesOrder.customer_email, ql),
             )
         )
         .order_by(SalesOrder.order_date.desc())
         .limit(limit)
-        .all()
+        .subquery()
     )
-    out = []
-    for so in rows:
-        meta = f"{so.channel} • { _fmt_date(so.order_date) }"
-        out.append({
-            "title": f"Order {so.order_number}",
-            "subtitle": meta,
-            "url": _so_url(so.id),
-        })
-    return out
-
-
-def _search_sales_lines(q: str, limit: int = 8):
-    # Helpful when user searches a SKU and wants orders containing it
-    ql = q.lower()
-    rows = (
-        db.session.query(SalesLine, SalesOrder)
+    lines = (
+        db.select(
+            db.literal(1).label("kind"),
+            SalesOrder.id,
+            SalesOrder.order_number,
+            SalesOrder.channel,
+            SalesOrder.order_date,
+            SalesLine.sku,
+            SalesLine.qty,
+        )
         .join(SalesOrder, SalesLine.sales_order_id == SalesOrder.id)
-        .filter(db.func.lower(SalesLine.sku).contains(ql))
+        .where(text_match(SalesLine.sku, ql))
         .order_by(SalesOrder.order_date.desc())
         .limit(limit)
-        .all()
+        .subquery()
     )
+    rows = db.session.execute(
+        db.union_all(db.select(orders), db.select(lines)).order_by("kind", db.desc("order_date"))
+    ).all()
+
     out = []
-    for sl, so in rows:
-        meta = f"{so.channel} • { _fmt_date(so.order_date) } • qty {sl.qty or 0}"
-        out.append({
-            "title": f"{sl.sku} in Order {so.order_number}",
-            "subtitle": meta,
-            "url": _so_url(so.id),
-        })
+    for r in rows:
+        if r.kind == 0:
+            out.append({
+                "title": f"Order {r.order_number}",
+                "subtitle": f"{r.channel} • { _fmt_date(r.order_date) }",
+                "url": _so_url(r.id),
+            })
+        else:
+            out.append({
+                "title": f"{r.sku} in Order {r.order_number}",
+                "subtitle": f"{r.channel} • { _fmt_date(r.order_date) } • qty {r.qty or 0}",
+                "url": _so_url(r.id),
+            })
     return out
 
 
@@ -167,16 +202,19 @@ def run_global_search(q: str):
     if not q:
         return {"catalog": [], "purchases": [], "sales": []}
 
-    # Keep it fast: small limits per group
-    catalog = _search_catalog(q, limit=8)
-
-    purchases = []
-    purchases.extend(_search_purchase_orders(q, limit=6))
-    purchases.extend(_search_purchase_lines(q, limit=6))
-
-    sales = []
-    sales.extend(_search_sales_orders(q, limit=6))
-    sales.extend(_search_sales_lines(q, limit=6))
+    # Keep it fast: small limits per group, independent queries run in parallel.
+    # Each worker gets a copy of the request context, hence its own app context
+    # and db session (connection); url_for keeps working there too.
+    searches = [
+        (_search_catalog, 8),
+        (_search_purchases, 6),
+        (_search_sales, 6),
+    ]
+    futures = [
+        _search_pool.submit(copy_current_request_context(fn), q, limit)
+        for fn, limit in searches
+    ]
+    catalog, purchases, sales = [f.result() for f in futures]
 
     # Trim groups (avoid overly long dropdown)
     return {
@@ -206,8 +244,7 @@ def api_search():
     # Cache key: normalized q + role (viewer vs user/admin)
     # (Role matters only if later you hide/expand results)
     role = getattr(current_user, "role", "viewer") or "viewer"
-    key_raw = f"v1|{role}|{q.lower()}"
-    key = hashlib.sha1(key_raw.encode("utf-8")).hexdigest()
+    key = f"v1|{role}|{q.lower()}"
 
     def build():
         return run_global_search(q)
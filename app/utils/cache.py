@@ -1,4 +1,7 @@
+import heapq
+import threading
 import time
+from collections import OrderedDict
 from typing import Any, Callable, Optional
 
 
@@ -7,42 +10,74 @@ class TTLCache:
     Very small in-process TTL cache.
     - Suitable for typeahead/search endpoints
     - Per-process (per Gunicorn worker)
+    - LRU order in an OrderedDict, expiry via a min-heap (no full scans on set)
+    - Thread-safe: shared with background refresh threads and the search pool
     """
 
     def __init__(self, ttl_seconds: int = 30, max_items: int = 512):
         self.ttl = int(ttl_seconds)
         self.max = int(max_items)
-        self._store = {}  # key -> (expires_at, value)
+        self._store = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._heap = []  # (expires_at, key); may hold stale entries for re-set/deleted keys
+        self._lock = threading.Lock()
 
     def get(self, key: str) -> Optional[Any]:
-        now = time.time()
-        item = self._store.get(key)
-        if not item:
-            return None
-        expires_at, val = item
-        if expires_at < now:
-            self._store.pop(key, None)
-            return None
-        return val
+        with self._lock:
+            item = self._store.get(key)
+            if not item:
+                return None
+            expires_at, val = item
+            if expires_at < time.monotonic():
+                self._store.pop(key, None)
+                return None
+            self._store.move_to_end(key)
+            return val
 
     def set(self, key: str, val: Any):
-        now = time.time()
-        if len(self._store) >= self.max:
-            # Evict expired first; if still too big, evict arbitrary oldest-ish by scanning
-            self.prune()
-            if len(self._store) >= self.max:
-                # pop one arbitrary key
-                self._store.pop(next(iter(self._store.keys())), None)
+        with self._lock:
+            now = time.monotonic()
+            if key not in self._store and len(self._store) >= self.max:
+                # Evict expired first; if still full, evict the least recently used
+                self._expire(now)
+                if len(self._store) >= self.max:
+                    self._store.popitem(last=False)
 
-        self._store[key] = (now + self.ttl, val)
+            expires_at = now + self.ttl
+            self._store[key] = (expires_at, val)
+            self._store.move_to_end(key)
+            heapq.heappush(self._heap, (expires_at, key))
+            if len(self._heap) > 2 * self.max:
+                self._prune()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._store.pop(key, None)
+
+    def _expire(self, now: float):
+        # Caller holds self._lock
+        heap = self._heap
+        while heap and heap[0][0] < now:
+            expires_at, key = heapq.heappop(heap)
+            item = self._store.get(key)
+            # Skip stale heap entries (key re-set with a later expiry, or gone)
+            if item and item[0] == expires_at:
+                del self._store[key]
 
     def prune(self):
-        now = time.time()
+        """Drop all expired entries and rebuild the expiry heap."""
+        with self._lock:
+            self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
         dead = [k for k, (exp, _) in self._store.items() if exp < now]
         for k in dead:
             self._store.pop(k, None)
+        self._heap = [(exp, k) for k, (exp, _) in self._store.items()]
+        heapq.heapify(self._heap)
 
     def get_or_set(self, key: str, fn: Callable[[], Any]) -> Any:
+        # fn runs outside the lock; concurrent misses may both compute
         val = self.get(key)
         if val is not None:
             return val
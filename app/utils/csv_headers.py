@@ -0,0 +1,10 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=256)
+def norm_header(s: str) -> str:
+    """
+    CSV header key ignoring case/spacing/punctuation ("Order Number" == "order_number").
+    Header names repeat across rows and imports, so each distinct one is normalized once.
+    """
+    return "".join(ch.lower() for ch in (s or "").strip() if ch.isalnum())
@@ -0,0 +1,25 @@
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+_ISO_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+@lru_cache(maxsize=4096)
+def parse_date(s: str):
+    """
+    Parse a stripped, non-empty date string; None if unparseable.
+    Supports: YYYY-MM-DD, DD/MM/YYYY, DD/MM/YY, YYYY-MM-DD HH:MM:SS, YYYY-MM-DDTHH:MM:SS
+    Import rows and query strings repeat the same few dates; ISO dates skip strptime entirely.
+    """
+    if _ISO_DATE_RE.match(s):
+        try:
+            return date.fromisoformat(s)
+        except ValueError:
+            return None
+    for fmt in ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
@@ -0,0 +1,10 @@
+from decimal import Decimal
+
+
+def to_decimal(x) -> Decimal:
+    """
+    Numeric columns already come back as Decimal; only convert other types (None -> 0).
+    """
+    if isinstance(x, Decimal):
+        return x
+    return Decimal(str(x or 0))
@@ -0,0 +1,9 @@
+from ..extensions import db
+
+
+def text_match(col, ql: str):
+    """
+    Case-insensitive substring filter for an already-lowercased search term:
+    lower(col) LIKE '%q%', served by the lower(col) trigram indexes.
+    """
+    return db.func.lower(col).contains(ql)